@@ -2,14 +2,36 @@ import os
 import json
 import time
 import io
-import requests
+import uuid
+import httpx
 from datetime import datetime
 from dotenv import load_dotenv
 from openai import OpenAI
 from azure.identity import DefaultAzureCredential, ManagedIdentityCredential, AzureCliCredential, ChainedTokenCredential, ClientSecretCredential
-import msal
 import streamlit as st
 import pandas as pd
+from services.answer_cache import answer_cache
+from services.chat_formatting import (
+    build_chat_export,
+    format_response_with_sql,
+    process_uploaded_file,
+    split_answer,
+)
+from services.circuit_breaker import CircuitOpenError
+from services.fabric_client import (
+    CapacityNotActiveError,
+    FabricAgentError,
+    FabricRunFailedError,
+    FabricRunTimeoutError,
+    fabric_api_base,
+    get_fabric_client,
+    get_fabric_token_provider,
+)
+from services.health import get_health_monitor
+from services.keepwarm import FABRIC_KEEPWARM_ENABLED, start_keep_warm
+from services.prewarm import FABRIC_PREWARM_ENABLED, start_quick_action_prewarm
+from services.query_stats import latency_summary, query_log
+from services.telemetry import FABRIC_METRICS_PORT, start_metrics_server
 
 load_dotenv()
 
@@ -22,8 +44,29 @@ FABRIC_CLIENT_ID = os.getenv("FABRIC_CLIENT_ID", "")
 FABRIC_CLIENT_SECRET = os.getenv("FABRIC_CLIENT_SECRET", "")
 FABRIC_TENANT_ID = os.getenv("FABRIC_TENANT_ID", "")
 
-# Fabric Data Agent API base URL - uses the aiassistant/openai endpoint with api-version
-FABRIC_API_BASE = f"https://api.fabric.microsoft.com/v1/workspaces/{FABRIC_WORKSPACE_ID}/dataagents/{FABRIC_ARTIFACT_ID}/aiassistant/openai"
+# Fabric Data Agent API base URL - uses the aiassistant/openai endpoint with api-version.
+# FABRIC_API_BASE overrides it, e.g. to point the app at a local stand-in for testing.
+FABRIC_API_BASE = fabric_api_base(FABRIC_WORKSPACE_ID, FABRIC_ARTIFACT_ID, os.getenv("FABRIC_API_BASE"))
+
+# Chat messages rendered by default; earlier ones are behind a "load earlier" button
+FABRIC_CHAT_HISTORY_SIZE = int(os.getenv("FABRIC_CHAT_HISTORY_SIZE", "20"))
+
+# Demo-friendly quick questions - natural language for Fabric Data Agent NL-to-SQL.
+# With FABRIC_PREWARM_ENABLED their answers are pre-warmed into the answer cache in the background.
+QUICK_QUESTIONS = [
+    ("📊 Database Overview", "Show me a summary of all tables in the database with their record counts."),
+    ("🩺 Top 10 Conditions", "What are the top 10 most common medical conditions? Show the condition name and how many patients have each."),
+    ("💊 Medication Analysis", "What are the top 10 medications by total cost? Show the medication name, total cost, and number of prescriptions."),
+    ("🏥 Encounter Types", "Break down all patient encounters by type. Show the encounter class, count, and total costs."),
+    ("👥 Patient Demographics", "Show patient demographics: total count, gender breakdown, average age, and counts by race."),
+    ("🤧 Common Allergies", "What are the most common allergies? Show top 10 by number of patients affected."),
+    ("🏢 Healthcare Facilities", "List the top 10 healthcare organizations by number of patient encounters."),
+    ("👨‍⚕️ Provider Statistics", "Show the top 10 healthcare providers with the most patient encounters."),
+    ("💉 Vaccinations", "What are the top 10 most administered vaccines? Show vaccine name and patient count."),
+    ("💰 Cost Analysis", "What is the average healthcare expense and coverage per patient? Show a breakdown."),
+    ("📋 Care Plans", "Show active care plans (where stop date is null) grouped by description."),
+    ("🔬 Vital Signs", "Show average vital sign values grouped by observation type (like blood pressure, heart rate, BMI)."),
+]
 
 # Page configuration
 st.set_page_config(
@@ -114,6 +157,15 @@ st.markdown("""
         animation: pulse 2s infinite;
     }
     
+    .status-dot.warning {
+        background: #ffd43b;
+    }
+    
+    .status-dot.error {
+        background: #ff6b6b;
+        animation: none;
+    }
+    
     @keyframes pulse {
         0%, 100% { opacity: 1; }
         50% { opacity: 0.5; }
@@ -325,84 +377,36 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 
-def check_fabric_connection_status():
-    """Quick check to see if Fabric Data Agent is accessible."""
-    try:
-        token = get_fabric_token()
-        
-        # Make a simple API call to check connectivity
-        base_url = FABRIC_API_BASE
-        api_version = "2024-07-01-preview"
-        
-        headers = {
-            "Authorization": f"Bearer {token}",
-            "Content-Type": "application/json",
-        }
-        
-        # Try to create an assistant (quick connectivity check)
-        resp = requests.post(
-            f"{base_url}/assistants?api-version={api_version}",
-            headers=headers,
-            json={"model": "not used"},
-            timeout=15
-        )
-        
-        if resp.status_code == 200:
-            return {"status": "connected", "message": "Connected to Fabric Data Agent"}
-        elif resp.status_code == 404:
-            resp_json = resp.json() if resp.text else {}
-            if resp_json.get("errorCode") == "CapacityNotActive":
-                return {"status": "capacity_paused", "message": "Fabric capacity is paused"}
-            return {"status": "not_found", "message": "Data Agent not found"}
-        else:
-            return {"status": "error", "message": f"HTTP {resp.status_code}"}
-            
-    except requests.exceptions.Timeout:
-        return {"status": "timeout", "message": "Connection timed out"}
-    except Exception as e:
-        return {"status": "error", "message": str(e)}
+# Health status -> (badge emoji, short label, status-dot CSS class)
+STATUS_DISPLAY = {
+    "connected": ("🟢", "Active", ""),
+    "capacity_paused": ("🟡", "Paused", "warning"),
+    "checking": ("🟡", "Checking", "warning"),
+    "timeout": ("🔴", "Timeout", "error"),
+    "not_found": ("🔴", "Not Found", "error"),
+    "auth_error": ("🔴", "Auth Error", "error"),
+    "error": ("🔴", "Error", "error"),
+}
 
 
-def format_response_with_sql(response):
-    """Extract and format SQL from response for better display.
+def check_fabric_connection_status():
+    """Quick check to see if Fabric Data Agent is accessible.
     
-    Returns the response with SQL blocks highlighted and potentially
-    extracted into separate code blocks.
+    Returns the process-wide cached health probe result (a GET that creates
+    nothing server-side, refreshed in the background every
+    FABRIC_HEALTH_INTERVAL seconds) rather than calling the API per rerun.
     """
-    import re
-    
-    # Check if response contains SQL
-    if not response:
-        return response
-    
-    # Common SQL keywords that indicate a SQL block
-    sql_indicators = ['SELECT', 'INSERT', 'UPDATE', 'DELETE', 'CREATE', 'ALTER', 'DROP', 'WITH', 'FROM', 'WHERE']
-    
-    # Look for code blocks with SQL
-    sql_pattern = r'```sql\n(.*?)\n```'
-    matches = re.findall(sql_pattern, response, re.IGNORECASE | re.DOTALL)
-    
-    if matches:
-        # Response already has SQL code blocks - leave as is
-        return response
-    
-    # Look for inline SQL that might not be in code blocks
-    # This is a simple heuristic - look for SELECT...FROM patterns
-    inline_sql_pattern = r'(SELECT\s+.+?\s+FROM\s+.+?)(?:\n\n|\Z)'
-    
-    formatted = response
-    for match in re.finditer(inline_sql_pattern, response, re.IGNORECASE | re.DOTALL):
-        sql = match.group(1).strip()
-        if len(sql) > 50:  # Only format substantial SQL
-            formatted = formatted.replace(sql, f"\n```sql\n{sql}\n```\n")
-    
-    return formatted
+    if not st.session_state.get("initialized"):
+        return {"status": "auth_error", "message": "Not connected to Fabric", "checked_at": None, "latency": None}
+    return get_health_monitor(fabric_engine()).status()
 
 
 def init_session_state():
     defaults = {
         "credential": None,
         "conversation_id": None,
+        # Identifies this browser session in the shared Fabric run queue
+        "session_id": uuid.uuid4().hex,
         "initialized": False,
         "messages": [{
             "role": "assistant", 
@@ -438,6 +442,10 @@ I can query your Fabric lakehouse directly and provide data-driven insights!""",
             "timestamp": datetime.now().isoformat()
         }],
         "query_history": [], 
+        # Number of most recent chat messages rendered (grows with "load earlier")
+        "history_shown": FABRIC_CHAT_HISTORY_SIZE,
+        # Latency, phase breakdown and outcome of each query (see record_query_stats)
+        "query_stats": [],
         "uploaded_files": [], 
         "file_summaries": {}
     }
@@ -475,43 +483,51 @@ def get_fabric_credential():
         raise
 
 
+def fabric_token_provider():
+    """Process-wide token provider for the configured app registration / credential."""
+    return get_fabric_token_provider(
+        FABRIC_TENANT_ID,
+        FABRIC_CLIENT_ID,
+        FABRIC_CLIENT_SECRET,
+        credential_factory=get_fabric_credential
+    )
+
+
+def fabric_engine():
+    """Process-wide client (async engine) that runs the Data Agent ask flow."""
+    return get_fabric_client(FABRIC_API_BASE, fabric_token_provider())
+
+
 def get_fabric_token():
-    """Get access token for Fabric API using MSAL or Azure Identity."""
-    # If client secret is set, use MSAL for token acquisition
-    if FABRIC_CLIENT_SECRET:
-        try:
-            authority = f"https://login.microsoftonline.com/{FABRIC_TENANT_ID}"
-            app = msal.ConfidentialClientApplication(
-                FABRIC_CLIENT_ID,
-                authority=authority,
-                client_credential=FABRIC_CLIENT_SECRET
-            )
-            
-            # Get token for Fabric API
-            scopes = ["https://api.fabric.microsoft.com/.default"]
-            result = app.acquire_token_for_client(scopes=scopes)
-            
-            if "access_token" in result:
-                return result["access_token"]
-            else:
-                error_msg = result.get("error_description", result.get("error", "Unknown error"))
-                st.error(f"❌ MSAL token acquisition failed: {error_msg}")
-                raise Exception(f"MSAL error: {error_msg}")
-                
-        except Exception as e:
-            st.error(f"❌ Failed to get MSAL token: {e}")
-            raise
+    """Get access token for Fabric API using MSAL or Azure Identity.
     
-    # Fall back to Azure Identity credential
-    credential = st.session_state.get("credential")
-    if not credential:
-        credential = get_fabric_credential()
-        st.session_state["credential"] = credential
-    token = credential.get_token("https://api.fabric.microsoft.com/.default")
-    return token.token
+    Tokens come from a process-wide provider that keeps one MSAL app and
+    reuses each token until shortly before it expires, so questions and
+    retries don't each make a fresh AAD request.
+    """
+    try:
+        return fabric_token_provider().get_token()
+    except Exception as e:
+        st.error(f"❌ Failed to get Fabric token: {e}")
+        raise
+
 
+CAPACITY_NOT_ACTIVE_MESSAGE = """⚠️ **Fabric Capacity Not Active**
 
-def call_fabric_agent(user_message, conversation_id=None, max_retries=3):
+The Microsoft Fabric capacity is currently paused or not running.
+
+**To fix this:**
+1. Go to [Microsoft Fabric Admin Portal](https://app.fabric.microsoft.com/admin-portal)
+2. Navigate to **Capacity settings**
+3. Find your capacity and click **Resume** or **Start**
+4. Wait 1-2 minutes for the capacity to become active
+5. Try your query again
+
+**Note:** Fabric capacities auto-pause after inactivity to save costs. This is normal behavior."""
+
+
+def call_fabric_agent(user_message, conversation_id=None, max_retries=3, on_delta=None, cache_key=None, self_contained=False,
+                      user_id=None, on_queue=None, stats=None):
     """Call the Fabric Data Agent API using the documented pattern.
     
     According to Microsoft docs, the correct flow is:
@@ -523,149 +539,86 @@ def call_fabric_agent(user_message, conversation_id=None, max_retries=3):
     6. Get messages
     7. Delete thread (cleanup)
     
+    Follow-up questions pass the previous `conversation_id` (thread ID) and
+    are appended to that thread while it is young enough and under its turn
+    limit (FABRIC_THREAD_MAX_AGE / FABRIC_THREAD_MAX_TURNS), skipping step 2
+    and letting the agent reuse the conversation's context. The thread is
+    only deleted once it is retired.
+    
+    The flow itself runs on the process-wide asyncio engine
+    (services/fabric_engine.py), so waiting on the API doesn't hold a server
+    thread per question; this function blocks on the result and turns
+    errors into chat-ready markdown.
+    
+    When `on_delta` is given (and FABRIC_STREAMING is on), the run is created
+    with stream=true and `on_delta(text_so_far)` is called as the answer
+    arrives; steps 5-6 are then only needed if the stream is unavailable or
+    drops before the run finishes.
+    
+    Successful answers are stored in the process-wide answer cache under
+    `cache_key` when they don't depend on earlier turns - i.e. the question
+    started a fresh thread or is marked `self_contained` (Quick Actions).
+    
+    Questions that can't depend on earlier turns (no conversation yet, or
+    `self_contained`) are also coalesced under `cache_key`: if another session
+    is already asking the same question, this call waits for that run and
+    shares its answer or error instead of starting a duplicate.
+    
+    While the shared circuit breaker is open (capacity paused, or a burst of
+    5xx errors) questions fail immediately with the reason it opened, and a
+    single probe question is let through once the cooldown has passed.
+    
+    At most FABRIC_MAX_ACTIVE_RUNS questions run at once across all sessions;
+    the rest wait in a queue that is fair per `user_id`, and `on_queue`
+    receives `(position, wait_seconds)` while waiting (`(0, 0)` once running).
+    
     Includes retry logic with exponential backoff for transient errors.
-    """
-    import time as time_module
     
-    for attempt in range(max_retries):
-        try:
-            token = get_fabric_token()
-            
-            # Use the API base URL with api-version parameter
-            base_url = FABRIC_API_BASE
-            api_version = "2024-07-01-preview"
-            
-            headers = {
-                "Authorization": f"Bearer {token}",
-                "Content-Type": "application/json",
-                "Accept": "application/json"
-            }
-            
-            thread_id = None
-            assistant_id = None
-            
-            try:
-                # Step 1: Create an assistant (this is KEY - returns the proper internal assistant ID)
-                # Per docs: assistant = fabric_client.beta.assistants.create(model="not used")
-                assistant_resp = requests.post(
-                    f"{base_url}/assistants?api-version={api_version}",
-                    headers=headers,
-                    json={"model": "not used"},  # Model is managed by Fabric
-                    timeout=60
-                )
-                
-                # Check for Capacity Not Active error
-                if assistant_resp.status_code == 404:
-                    resp_json = assistant_resp.json() if assistant_resp.text else {}
-                    if resp_json.get("errorCode") == "CapacityNotActive":
-                        return """⚠️ **Fabric Capacity Not Active**
+    A `stats` dict receives the question's `phases`, `attempts`, `shared`
+    flag and `outcome` for the latency analytics.
+    """
+    shareable = cache_key is not None and (self_contained or conversation_id is None)
+    try:
+        assistant_response, thread_id = fabric_engine().ask_sync(
+            user_message,
+            thread_id=conversation_id,
+            max_retries=max_retries,
+            on_delta=on_delta,
+            flight_key=cache_key if shareable else None,
+            user_id=user_id,
+            on_queue=on_queue,
+            stats=stats
+        )
+        
+        if assistant_response:
+            if cache_key and (self_contained or thread_id != conversation_id):
+                answer_cache.put(cache_key, assistant_response)
+            return assistant_response, thread_id
+        if stats is not None:
+            stats["outcome"] = "empty"
+        return "No response received from agent.", thread_id
+    
+    except CapacityNotActiveError:
+        return CAPACITY_NOT_ACTIVE_MESSAGE, conversation_id
+    
+    except CircuitOpenError as e:
+        if isinstance(e.reason, CapacityNotActiveError):
+            return CAPACITY_NOT_ACTIVE_MESSAGE, conversation_id
+        return f"""⚠️ **Fabric Data Agent Temporarily Unavailable**
 
-The Microsoft Fabric capacity is currently paused or not running.
+Recent requests to the Data Agent kept failing, so new questions are paused to let it recover.
 
-**To fix this:**
-1. Go to [Microsoft Fabric Admin Portal](https://app.fabric.microsoft.com/admin-portal)
-2. Navigate to **Capacity settings**
-3. Find your capacity and click **Resume** or **Start**
-4. Wait 1-2 minutes for the capacity to become active
-5. Try your query again
+**Last Error:** `{str(e.reason)[:200]}`
 
-**Note:** Fabric capacities auto-pause after inactivity to save costs. This is normal behavior.""", conversation_id
-                
-                assistant_resp.raise_for_status()
-                assistant = assistant_resp.json()
-                assistant_id = assistant.get("id")
-                
-                # Step 2: Create a thread
-                thread_resp = requests.post(
-                    f"{base_url}/threads?api-version={api_version}",
-                    headers=headers,
-                    json={},
-                    timeout=30
-                )
-                thread_resp.raise_for_status()
-                thread = thread_resp.json()
-                thread_id = thread.get("id")
-                
-                # Step 3: Add message to thread
-                msg_resp = requests.post(
-                    f"{base_url}/threads/{thread_id}/messages?api-version={api_version}",
-                    headers=headers,
-                    json={"role": "user", "content": user_message},
-                    timeout=30
-                )
-                msg_resp.raise_for_status()
-                
-                # Step 4: Create a run using the ASSISTANT ID (not the Data Agent artifact ID!)
-                run_resp = requests.post(
-                    f"{base_url}/threads/{thread_id}/runs?api-version={api_version}",
-                    headers=headers,
-                    json={"assistant_id": assistant_id},  # Use the assistant ID from step 1!
-                    timeout=30
-                )
-                run_resp.raise_for_status()
-                run = run_resp.json()
-                run_id = run.get("id")
-                run_status = run.get("status")
-                
-                # Step 5: Poll for completion (with timeout)
-                max_wait = 300  # 5 minutes max for complex queries
-                poll_interval = 2
-                start_time = time_module.time()
-                
-                while run_status in ['queued', 'in_progress']:
-                    if time_module.time() - start_time > max_wait:
-                        return "⏱️ Request timed out. The query is taking too long.", thread_id
-                    time_module.sleep(poll_interval)
-                    
-                    # Check run status
-                    status_resp = requests.get(
-                        f"{base_url}/threads/{thread_id}/runs/{run_id}?api-version={api_version}",
-                        headers=headers,
-                        timeout=30
-                    )
-                    status_resp.raise_for_status()
-                    run = status_resp.json()
-                    run_status = run.get("status")
-                
-                if run_status == 'completed':
-                    # Step 6: Get messages from thread
-                    msgs_resp = requests.get(
-                        f"{base_url}/threads/{thread_id}/messages?api-version={api_version}&order=asc",
-                        headers=headers,
-                        timeout=30
-                    )
-                    msgs_resp.raise_for_status()
-                    messages = msgs_resp.json()
-                    
-                    # Find assistant's response (last message from assistant)
-                    assistant_response = ""
-                    for msg in messages.get("data", []):
-                        if msg.get("role") == "assistant":
-                            for content in msg.get("content", []):
-                                if content.get("type") == "text":
-                                    assistant_response = content.get("text", {}).get("value", "")
-                    
-                    # Step 7: Cleanup - delete thread
-                    try:
-                        requests.delete(
-                            f"{base_url}/threads/{thread_id}?api-version={api_version}",
-                            headers=headers,
-                            timeout=10
-                        )
-                    except:
-                        pass  # Don't fail if cleanup fails
-                    
-                    if assistant_response:
-                        return assistant_response, thread_id
-                    return "No response received from agent.", thread_id
-                else:
-                    # Handle failed runs with specific error guidance
-                    last_error = run.get("last_error", {})
-                error_code = last_error.get("code", "") if isinstance(last_error, dict) else ""
-                error_msg = last_error.get("message", str(last_error)) if isinstance(last_error, dict) else str(last_error)
-                
-                if error_code == "server_error" and "OpenAI request" in error_msg:
-                    return f"""⚠️ **Fabric Data Agent Internal Error**
+The app will try again automatically in about {e.retry_after:.0f} seconds - please retry your query then.""", conversation_id
+    
+    except FabricRunTimeoutError as e:
+        return "⏱️ Request timed out. The query is taking too long.", e.thread_id
+    
+    except FabricRunFailedError as e:
+        # Handle failed runs with specific error guidance
+        if e.error_code == "server_error" and "OpenAI request" in e.error_message:
+            return f"""⚠️ **Fabric Data Agent Internal Error**
 
 The query was submitted but Fabric's AI backend failed to process it.
 
@@ -678,42 +631,17 @@ The query was submitted but Fabric's AI backend failed to process it.
 4. **Check Fabric capacity** - Ensure your capacity has AI workloads enabled
 
 **Technical Details:**
-- Error: `{error_code}`
-- Message: `{error_msg[:200]}`
-- Thread ID: `{thread_id}`
-- Assistant ID: `{assistant_id}`""", thread_id
-                
-                return f"❌ Query failed with status: {run_status}\nError: {error_msg}", thread_id
-                
-            except requests.exceptions.HTTPError as http_err:
-                error_str = str(http_err)
-                status_code = http_err.response.status_code if http_err.response else "unknown"
-                response_text = http_err.response.text if http_err.response else ""
-                
-                # Check for Capacity Not Active in HTTP error
-                if "CapacityNotActive" in response_text:
-                    return """⚠️ **Fabric Capacity Not Active**
-
-The Microsoft Fabric capacity is currently paused or not running.
-
-**To fix this:**
-1. Go to [Microsoft Fabric Admin Portal](https://app.fabric.microsoft.com/admin-portal)
-2. Navigate to **Capacity settings**
-3. Find your capacity and click **Resume** or **Start**
-4. Wait 1-2 minutes for the capacity to become active
-5. Try your query again
-
-**Note:** Fabric capacities auto-pause after inactivity to save costs.""", conversation_id
-                
-                # Check if it's a retryable error (5xx or connection issues)
-                if status_code >= 500 and attempt < max_retries - 1:
-                    wait_time = (2 ** attempt) * 2  # Exponential backoff: 2, 4, 8 seconds
-                    time_module.sleep(wait_time)
-                    continue  # Retry
-                
-                # Check if it's a 404 error - Data Agent not found
-                if status_code == 404:
-                    error_msg = f"""⚠️ **Data Agent Not Found (404)**
+- Error: `{e.error_code}`
+- Message: `{e.error_message[:200]}`
+- Thread ID: `{e.thread_id}`
+- Assistant ID: `{e.assistant_id}`""", e.thread_id
+        
+        return f"❌ Query failed with status: {e.run_status}\nError: {e.error_message}", e.thread_id
+    
+    except FabricAgentError as e:
+        # Check if it's a 404 error - Data Agent not found
+        if e.status_code == 404:
+            return f"""⚠️ **Data Agent Not Found (404)**
 
 The API endpoint returned a 404 error.
 
@@ -728,29 +656,16 @@ The API endpoint returned a 404 error.
 - Workspace ID: `{FABRIC_WORKSPACE_ID}`
 - Data Agent ID: `{FABRIC_ARTIFACT_ID}`
 
-**Debug Info:** {response_text[:300]}"""
-                    return error_msg, conversation_id
-                
-                return f"❌ HTTP Error {status_code}: {response_text[:300]}", conversation_id
-                
-            except Exception as api_error:
-                # Retry on transient errors
-                if attempt < max_retries - 1:
-                    wait_time = (2 ** attempt) * 2
-                    time_module.sleep(wait_time)
-                    continue
-                return f"❌ Error calling Data Agent API: {str(api_error)}", conversation_id
-                
-        except requests.exceptions.Timeout:
-            if attempt < max_retries - 1:
-                continue  # Retry on timeout
-            return "❌ Request timed out after multiple attempts. Please try again later.", conversation_id
-        except Exception as e:
-            if attempt < max_retries - 1:
-                continue
-            return f"❌ Error calling Fabric Agent: {str(e)}", conversation_id
+**Debug Info:** {e.response_text[:300]}""", conversation_id
+        
+        if e.status_code:
+            return f"❌ HTTP Error {e.status_code}: {e.response_text[:300]}", conversation_id
+        return "❌ Failed after multiple retry attempts. Please try again later.", conversation_id
     
-    return "❌ Failed after multiple retry attempts. Please try again later.", conversation_id
+    except httpx.TimeoutException:
+        return "❌ Request timed out after multiple attempts. Please try again later.", conversation_id
+    except Exception as e:
+        return f"❌ Error calling Fabric Agent: {str(e)}", conversation_id
 
 
 def get_file_context():
@@ -762,184 +677,224 @@ def get_file_context():
     return context
 
 
-def process_uploaded_file(uploaded_file):
-    try:
-        if uploaded_file.name.endswith('.csv'):
-            df = pd.read_csv(uploaded_file)
-        elif uploaded_file.name.endswith(('.xlsx', '.xls')):
-            df = pd.read_excel(uploaded_file)
-        else:
-            return None, "Unsupported file format."
-        summary = f"Shape: {df.shape[0]} rows x {df.shape[1]} columns\nColumns: {', '.join(df.columns.tolist())}\nSample:\n{df.head(3).to_string()}"
-        return df, summary
-    except Exception as e:
-        return None, f"Error: {str(e)}"
+def cached_badge(cached_at):
+    """Caption shown above answers served from the answer cache."""
+    return f"⚡ Cached answer from {datetime.fromisoformat(cached_at).strftime('%I:%M %p')}"
+
+
+def render_table(df):
+    """Interactive table over every row: sorting, search and scrolling happen in the browser."""
+    column_config = {
+        name: st.column_config.NumberColumn(format=number_format)
+        for name, number_format in df.attrs.get("number_formats", {}).items()
+    }
+    st.dataframe(df, hide_index=True, use_container_width=True, column_config=column_config)
+
+
+def render_message(msg):
+    """Render a chat message; answer tables are parsed into DataFrames once and kept on the message."""
+    if msg["role"] != "assistant":
+        st.markdown(msg["content"])
+        return
+    if "segments" not in msg:
+        msg["segments"] = split_answer(msg["content"])
+    for kind, value in msg["segments"]:
+        if kind == "table":
+            render_table(value)
+        elif value.strip():
+            st.markdown(value)
+
+
+def record_query_stats(query, latency, stats, cached=False):
+    """Record one query for the latency analytics (this session and process-wide)."""
+    record = {
+        "timestamp": datetime.now().isoformat(),
+        "session_id": st.session_state.get("session_id"),
+        "query": query,
+        "latency": latency,
+        "phases": stats.get("phases", {}),
+        "attempts": stats.get("attempts", 0 if cached else 1),
+        "cached": cached,
+        "shared": stats.get("shared", False),
+        "outcome": "cached" if cached else stats.get("outcome", "error"),
+    }
+    st.session_state["query_stats"].append(record)
+    query_log.add(record)
 
 
-def run_fabric_query(user_query, placeholder):
-    """Run a query through the Fabric Data Agent with progress indication."""
+def run_fabric_query(user_query, placeholder, self_contained=False):
+    """Run a query through the Fabric Data Agent with progress indication.
+    
+    Questions that start a fresh thread (no conversation yet, or
+    `self_contained` Quick Actions) are answered from the answer cache (same
+    agent, normalized question and uploaded-file context) when possible;
+    follow-ups always go to the conversation's thread. Self-contained
+    questions are asked on a thread of their own, leaving the conversation
+    untouched.
+    
+    Every query's latency and phase breakdown is recorded for the Analytics tab.
+    
+    Returns `(response, cached_at)`; `cached_at` is the ISO timestamp of the
+    cached answer, or None if the agent was called.
+    """
     dots = ["⠋", "⠙", "⠹", "⠸", "⠼", "⠴", "⠦", "⠧", "⠇", "⠏"]
+    started = time.monotonic()
+    question = user_query
+    
+    # Add file context if available
+    file_context = get_file_context()
+    cache_key = answer_cache.make_key(FABRIC_WORKSPACE_ID, FABRIC_ARTIFACT_ID, user_query, file_context)
+    conversation_id = None if self_contained else st.session_state.get("conversation_id")
+    cached = answer_cache.get(cache_key) if conversation_id is None else None
+    if cached:
+        record_query_stats(question, time.monotonic() - started, {}, cached=True)
+        return cached["answer"], datetime.fromtimestamp(cached["created_at"]).isoformat()
     
     # Show initial progress
     placeholder.markdown(f"**{dots[0]} Connecting to Fabric Data Agent...**")
     
-    # Add file context if available
-    file_context = get_file_context()
     if file_context:
         user_query = f"{user_query}\n\n{file_context}"
     
+    # Render streamed text as it arrives, throttled to limit websocket traffic
+    last_render = [0.0]
+    
+    def render_delta(text):
+        now = time.time()
+        if now - last_render[0] >= 0.1:
+            placeholder.markdown(text + " ▌")
+            last_render[0] = now
+    
+    def render_queue(position, wait):
+        if position:
+            placeholder.markdown(
+                f"**⏳ Fabric is busy - you're #{position} in the queue (about {wait:.0f}s wait)...**"
+            )
+        else:
+            placeholder.markdown(f"**{dots[0]} Connecting to Fabric Data Agent...**")
+    
     # Call the Fabric Data Agent
+    stats = {}
     response, new_conv_id = call_fabric_agent(
         user_query, 
-        st.session_state.get("conversation_id")
+        conversation_id,
+        on_delta=render_delta,
+        cache_key=cache_key,
+        self_contained=self_contained,
+        user_id=st.session_state.get("session_id"),
+        on_queue=render_queue,
+        stats=stats
     )
+    record_query_stats(question, time.monotonic() - started, stats)
     
-    # Update conversation ID for continuity
-    st.session_state["conversation_id"] = new_conv_id
-    
-    return response
+    if self_contained:
+        # The one-off thread isn't part of the conversation
+        if new_conv_id:
+            try:
+                fabric_engine().end_conversation_sync(new_conv_id)
+            except Exception:
+                pass  # The engine expires it later anyway
+    else:
+        # Update conversation ID for continuity
+        st.session_state["conversation_id"] = new_conv_id
+    
+    return response, None
 
 
 def export_chat():
-    export = f"""# 🏥 Synthea Healthcare Agent - Chat Export
-**Exported:** {datetime.now().strftime('%B %d, %Y at %I:%M %p')}
-**Connected to:** Microsoft Fabric Data Agent
+    return build_chat_export(st.session_state["messages"])
 
----
 
-"""
-    for msg in st.session_state["messages"]:
-        role = "👤 **User**" if msg["role"] == "user" else "🤖 **Assistant**"
-        export += f"{role}\n\n{msg['content']}\n\n---\n\n"
-    return export
+def queue_question(query, self_contained=False):
+    """Queue a question for the chat panel to answer during the next run."""
+    st.session_state["pq"] = {"query": query, "self_contained": self_contained}
 
 
-# Initialize session state
-init_session_state()
+def queue_chat_input():
+    queue_question(st.session_state["chat_input"])
 
-# Initialize Fabric credential on first load
-if not st.session_state["initialized"]:
-    with st.spinner("🔄 Connecting to Fabric Data Agent..."):
-        try:
-            st.session_state["credential"] = get_fabric_credential()
-            # Test the connection by getting a token
-            get_fabric_token()
-            st.session_state["initialized"] = True
-        except Exception as e:
-            st.error(f"❌ Failed to connect to Fabric: {e}")
 
-# Header
-st.markdown("""
-<div class="agent-header">
-    <div class="agent-title">🏥 Synthea Healthcare Agent</div>
-    <div class="agent-subtitle">AI-powered healthcare data analysis with Microsoft Fabric</div>
-    <div class="status-badge">
-        <div class="status-dot"></div>
-        <span>Connected to Fabric Data Agent • Synthea Lakehouse</span>
-    </div>
-</div>
-""", unsafe_allow_html=True)
+def load_earlier_messages():
+    st.session_state["history_shown"] += FABRIC_CHAT_HISTORY_SIZE
 
-# Main tabs
-tab1, tab2, tab3 = st.tabs(["💬 Chat", "📁 Upload Data", "📊 Analytics"])
 
-with tab1:
-    col1, col2 = st.columns([3, 1])
-    
-    with col1:
-        # Check for pending quick question BEFORE rendering
-        pending_query = None
-        if "pq" in st.session_state and st.session_state["pq"]:
-            pending_query = st.session_state["pq"]
-            st.session_state["pq"] = None
-        
-        # Chat container
-        chat_box = st.container(height=480)
-        with chat_box:
-            for msg in st.session_state["messages"]:
-                with st.chat_message(msg["role"], avatar="🤖" if msg["role"] == "assistant" else "👤"):
-                    st.markdown(msg["content"])
-            
-            # Process pending quick question inside the chat display
-            if pending_query:
-                ts = datetime.now().isoformat()
-                st.session_state["messages"].append({"role": "user", "content": pending_query, "timestamp": ts})
-                st.session_state["query_history"].append({"query": pending_query, "timestamp": ts})
-                
-                with st.chat_message("user", avatar="👤"):
-                    st.markdown(pending_query)
-                with st.chat_message("assistant", avatar="🤖"):
-                    ph = st.empty()
-                    ph.markdown("**⏳ Querying Fabric Data Agent...**")
-                    try:
-                        response = run_fabric_query(pending_query, ph)
-                        formatted_response = format_response_with_sql(response)
-                        st.session_state["messages"].append({
-                            "role": "assistant", 
-                            "content": formatted_response, 
-                            "timestamp": datetime.now().isoformat()
-                        })
-                        # Rerun to display the response properly in the chat history
-                        st.rerun()
-                    except Exception as e:
-                        ph.error(f"❌ Error: {e}")
-        
-        # Chat input
-        if user_input := st.chat_input("Ask about patient data, conditions, medications..."):
+def clear_uploaded_files():
+    st.session_state["uploaded_files"] = []
+    st.session_state["file_summaries"] = {}
+
+
+# The panels below are fragments: interacting with one ("load earlier", the
+# analytics scope, uploads) reruns only that panel. Asking a question changes
+# the history, Recent Queries and Analytics, so it queues the question and
+# reruns the page once; the chat panel answers it in place.
+
+@st.fragment
+def chat_panel():
+    pending = st.session_state.get("pq")
+    st.session_state["pq"] = None
+    messages = st.session_state["messages"]
+
+    with st.container(height=480):
+        # Only the most recent messages are rendered; each keeps its parsed render
+        first_shown = max(len(messages) - st.session_state["history_shown"], 0)
+        if first_shown:
+            st.button(f"⬆️ Load earlier messages ({first_shown} hidden)", key="load_earlier",
+                      on_click=load_earlier_messages, use_container_width=True)
+        for msg in messages[first_shown:]:
+            with st.chat_message(msg["role"], avatar="🤖" if msg["role"] == "assistant" else "👤"):
+                if msg.get("cached_at"):
+                    st.caption(cached_badge(msg["cached_at"]))
+                render_message(msg)
+
+        # Answer the queued question below the history
+        if pending:
+            query = pending["query"]
             ts = datetime.now().isoformat()
-            st.session_state["messages"].append({"role": "user", "content": user_input, "timestamp": ts})
-            st.session_state["query_history"].append({"query": user_input, "timestamp": ts})
-            
-            with chat_box:
-                with st.chat_message("user", avatar="👤"):
-                    st.markdown(user_input)
-                with st.chat_message("assistant", avatar="🤖"):
-                    ph = st.empty()
-                    ph.markdown("**⏳ Querying Fabric Data Agent...**")
-                    try:
-                        response = run_fabric_query(user_input, ph)
-                        formatted_response = format_response_with_sql(response)
-                        ph.markdown(formatted_response)
-                        st.session_state["messages"].append({
-                            "role": "assistant", 
-                            "content": formatted_response, 
-                            "timestamp": datetime.now().isoformat()
-                        })
-                    except Exception as e:
-                        ph.error(f"❌ Error: {e}")
+            messages.append({"role": "user", "content": query, "timestamp": ts})
+            st.session_state["query_history"].append({"query": query, "timestamp": ts})
+
+            with st.chat_message("user", avatar="👤"):
+                st.markdown(query)
+            with st.chat_message("assistant", avatar="🤖"):
+                ph = st.empty()
+                ph.markdown("**⏳ Querying Fabric Data Agent...**")
+                try:
+                    response, cached_at = run_fabric_query(query, ph, self_contained=pending["self_contained"])
+                    formatted_response = format_response_with_sql(response)
+                    message = {
+                        "role": "assistant",
+                        "content": formatted_response,
+                        "timestamp": datetime.now().isoformat(),
+                        "cached_at": cached_at
+                    }
+                    with ph.container():
+                        if cached_at:
+                            st.caption(cached_badge(cached_at))
+                        render_message(message)
+                    messages.append(message)
+                except Exception as e:
+                    ph.error(f"❌ Error: {e}")
+
+
+@st.fragment
+def quick_actions_panel():
+    st.markdown("### ⚡ Quick Actions")
     
-    with col2:
-        st.markdown("### ⚡ Quick Actions")
-        
-        # Demo-friendly quick questions - natural language for Fabric Data Agent NL-to-SQL
-        quick_questions = [
-            ("📊 Database Overview", "Show me a summary of all tables in the database with their record counts."),
-            ("🩺 Top 10 Conditions", "What are the top 10 most common medical conditions? Show the condition name and how many patients have each."),
-            ("💊 Medication Analysis", "What are the top 10 medications by total cost? Show the medication name, total cost, and number of prescriptions."),
-            ("🏥 Encounter Types", "Break down all patient encounters by type. Show the encounter class, count, and total costs."),
-            ("👥 Patient Demographics", "Show patient demographics: total count, gender breakdown, average age, and counts by race."),
-            ("🤧 Common Allergies", "What are the most common allergies? Show top 10 by number of patients affected."),
-            ("🏢 Healthcare Facilities", "List the top 10 healthcare organizations by number of patient encounters."),
-            ("👨‍⚕️ Provider Statistics", "Show the top 10 healthcare providers with the most patient encounters."),
-            ("💉 Vaccinations", "What are the top 10 most administered vaccines? Show vaccine name and patient count."),
-            ("💰 Cost Analysis", "What is the average healthcare expense and coverage per patient? Show a breakdown."),
-            ("📋 Care Plans", "Show active care plans (where stop date is null) grouped by description."),
-            ("🔬 Vital Signs", "Show average vital sign values grouped by observation type (like blood pressure, heart rate, BMI)."),
-        ]
-        
-        for label, query in quick_questions:
-            if st.button(label, key=f"quick_{label}", use_container_width=True):
-                st.session_state["pq"] = query
-                st.rerun()
-        
-        st.markdown("---")
-        st.markdown("### 📜 Recent Queries")
-        
-        for i, item in enumerate(reversed(st.session_state["query_history"][-5:])):
-            with st.expander(f"Q{len(st.session_state['query_history'])-i}", expanded=False):
-                st.caption(item["query"][:80] + "..." if len(item["query"]) > 80 else item["query"])
+    for label, query in QUICK_QUESTIONS:
+        if st.button(label, key=f"quick_{label}", use_container_width=True):
+            queue_question(query, self_contained=True)
+            st.rerun()  # Whole page, so Recent Queries and Analytics include the answer
+    
+    st.markdown("---")
+    st.markdown("### 📜 Recent Queries")
+    
+    for i, item in enumerate(reversed(st.session_state["query_history"][-5:])):
+        with st.expander(f"Q{len(st.session_state['query_history'])-i}", expanded=False):
+            st.caption(item["query"][:80] + "..." if len(item["query"]) > 80 else item["query"])
 
-with tab2:
+
+@st.fragment
+def upload_panel():
     st.markdown("### 📁 Upload Files for Analysis")
     st.markdown("Upload CSV or Excel files to include in your analysis context.")
     
@@ -981,14 +936,14 @@ with tab2:
                 st.markdown(f"✅ `{fname}`")
             
             st.markdown("---")
-            if st.button("🗑️ Clear All Files", use_container_width=True):
-                st.session_state["uploaded_files"] = []
-                st.session_state["file_summaries"] = {}
-                st.rerun()
+            st.button("🗑️ Clear All Files", on_click=clear_uploaded_files, use_container_width=True)
         else:
             st.info("No files uploaded yet")
 
-with tab3:
+
+@st.fragment
+def analytics_panel(connection_status):
+    status_emoji, status_label, _ = STATUS_DISPLAY.get(connection_status["status"], STATUS_DISPLAY["error"])
     st.markdown("### 📊 Session Analytics")
     
     # Metrics row
@@ -1000,7 +955,69 @@ with tab3:
     metrics_cols[0].metric("💬 Questions Asked", user_msgs, delta=f"+{user_msgs}" if user_msgs > 0 else None)
     metrics_cols[1].metric("🤖 Responses", assistant_msgs)
     metrics_cols[2].metric("📁 Files Uploaded", len(st.session_state["uploaded_files"]))
-    metrics_cols[3].metric("🟢 Agent Status", "Active")
+    metrics_cols[3].metric(f"{status_emoji} Agent Status", status_label, help=connection_status["message"])
+    
+    # Cold vs. warm latency across the app, to judge whether keep-warm pays off
+    if st.session_state["initialized"]:
+        warmth = fabric_engine().warmth.summary()
+        if warmth["cold"]["count"] or warmth["warm"]["count"]:
+            parts = [
+                f"{name} median {stats['median']:.1f}s ({stats['count']} questions)"
+                for name, stats in (("Cold", warmth["cold"]), ("Warm", warmth["warm"]))
+                if stats["count"]
+            ]
+            st.caption(f"🌡️ {' • '.join(parts)} • keep-warm {'on' if FABRIC_KEEPWARM_ENABLED else 'off'}")
+    
+    st.markdown("---")
+    
+    # Latency analytics - per session, or across every session in this process
+    st.markdown("### ⏱️ Query Latency")
+    scope = st.radio(
+        "Scope",
+        ["This session", "All sessions"],
+        horizontal=True,
+        label_visibility="collapsed",
+        help="All sessions covers every user of this app instance - compare them to tell "
+             "'Fabric is slow today' from 'this question is slow'."
+    )
+    latency_records = st.session_state["query_stats"] if scope == "This session" else query_log.records()
+    
+    if not latency_records:
+        st.info("No queries yet - latency stats appear after the first question.")
+    else:
+        summary = latency_summary(latency_records)
+        latency_cols = st.columns(5)
+        latency_cols[0].metric("p50", f"{summary['p50']:.1f}s")
+        latency_cols[1].metric("p95", f"{summary['p95']:.1f}s")
+        latency_cols[2].metric("p99", f"{summary['p99']:.1f}s")
+        latency_cols[3].metric("⚡ Cache Hits", f"{summary['cache_hit_rate']:.0%}")
+        latency_cols[4].metric("🔁 Retries", summary["retries"], help=f"{summary['errors']} failed of {summary['count']} queries")
+        
+        latency_df = pd.DataFrame(latency_records)
+        latency_df["timestamp"] = pd.to_datetime(latency_df["timestamp"])
+        latency_df["retries"] = (latency_df["attempts"] - 1).clip(lower=0)
+        
+        chart_col, phase_col = st.columns(2)
+        with chart_col:
+            st.markdown("**Latency over time (s)**")
+            st.line_chart(latency_df.set_index("timestamp")[["latency"]])
+        with phase_col:
+            phase_df = pd.DataFrame([r["phases"] for r in latency_records if r["phases"]])
+            if not phase_df.empty:
+                st.markdown("**Average time per phase (s)**")
+                # "ask" and "run" span the phases inside them (run = run_queue + run_execute)
+                st.bar_chart(phase_df.drop(columns=["ask", "run"], errors="ignore").fillna(0).mean())
+        
+        st.markdown("**🐢 Slowest Questions**")
+        st.dataframe(
+            latency_df.nlargest(10, "latency")[["timestamp", "query", "latency", "outcome", "retries", "cached"]],
+            hide_index=True,
+            use_container_width=True,
+            column_config={
+                "latency": st.column_config.NumberColumn("Latency (s)", format="%.1f"),
+                "timestamp": st.column_config.DatetimeColumn("When", format="HH:mm:ss"),
+            }
+        )
     
     st.markdown("---")
     
@@ -1030,6 +1047,74 @@ with tab3:
         else:
             st.info("No queries to export yet")
 
+
+# Initialize session state
+init_session_state()
+
+# Initialize Fabric credential on first load
+if not st.session_state["initialized"]:
+    with st.spinner("🔄 Connecting to Fabric Data Agent..."):
+        try:
+            st.session_state["credential"] = get_fabric_credential()
+            # Test the connection by getting a token
+            get_fabric_token()
+            st.session_state["initialized"] = True
+        except Exception as e:
+            st.error(f"❌ Failed to connect to Fabric: {e}")
+
+# Prometheus metrics for the ask flow (optional, started once per process)
+if FABRIC_METRICS_PORT:
+    start_metrics_server(FABRIC_METRICS_PORT)
+
+# Keep the Quick Actions answers warm (started once per process)
+if st.session_state["initialized"] and FABRIC_PREWARM_ENABLED:
+    start_quick_action_prewarm(
+        fabric_engine(),
+        [query for _, query in QUICK_QUESTIONS],
+        FABRIC_WORKSPACE_ID,
+        FABRIC_ARTIFACT_ID
+    )
+
+# Keep the agent warm during business hours (optional, started once per process)
+if st.session_state["initialized"] and FABRIC_KEEPWARM_ENABLED:
+    start_keep_warm(fabric_engine())
+
+# Connection status (cached health probe, shared by all sessions)
+connection_status = check_fabric_connection_status()
+status_emoji, status_label, status_dot_class = STATUS_DISPLAY.get(connection_status["status"], STATUS_DISPLAY["error"])
+
+# Header
+st.markdown(f"""
+<div class="agent-header">
+    <div class="agent-title">🏥 Synthea Healthcare Agent</div>
+    <div class="agent-subtitle">AI-powered healthcare data analysis with Microsoft Fabric</div>
+    <div class="status-badge">
+        <div class="status-dot {status_dot_class}"></div>
+        <span>{connection_status["message"]} • Synthea Lakehouse</span>
+    </div>
+</div>
+""", unsafe_allow_html=True)
+
+# Main tabs
+tab1, tab2, tab3 = st.tabs(["💬 Chat", "📁 Upload Data", "📊 Analytics"])
+
+with tab1:
+    col1, col2 = st.columns([3, 1])
+
+    with col1:
+        chat_panel()
+        # Outside the chat fragment, so a new question reruns the whole page
+        st.chat_input("Ask about patient data, conditions, medications...", key="chat_input", on_submit=queue_chat_input)
+
+    with col2:
+        quick_actions_panel()
+
+with tab2:
+    upload_panel()
+
+with tab3:
+    analytics_panel(connection_status)
+
 # Sidebar
 with st.sidebar:
     st.markdown("""
@@ -1047,6 +1132,7 @@ with st.sidebar:
     - **Backend:** Fabric Data Agent
     - **Lakehouse:** Synthea Graph
     - **Auth:** Azure AD / MI
+    - **Status:** {status_emoji} {status_label}
     """)
     
     st.markdown("---")
@@ -1058,9 +1144,20 @@ with st.sidebar:
             "timestamp": datetime.now().isoformat()
         }]
         st.session_state["query_history"] = []
-        st.session_state.pop("conversation_id", None)
+        st.session_state["history_shown"] = FABRIC_CHAT_HISTORY_SIZE
+        # Release the old conversation's thread so follow-ups start fresh
+        old_thread_id = st.session_state.pop("conversation_id", None)
+        if old_thread_id:
+            try:
+                fabric_engine().end_conversation_sync(old_thread_id)
+            except Exception:
+                pass  # Don't block starting over on cleanup
         st.rerun()
     
+    if st.button("🧹 Clear Answer Cache", use_container_width=True, help=f"{len(answer_cache)} cached answer(s)"):
+        answer_cache.clear()
+        st.toast("Answer cache cleared")
+    
     st.markdown("---")
     
     st.markdown("### 📊 Database Schema")
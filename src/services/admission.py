@@ -0,0 +1,135 @@
+import os
+import math
+import time
+import asyncio
+import statistics
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from dotenv import load_dotenv
+from services.telemetry import span
+
+load_dotenv()
+
+# Most questions the app runs against the capacity at once (0 disables the
+# limit); further questions wait in a queue that is fair across users
+FABRIC_MAX_ACTIVE_RUNS = int(os.getenv("FABRIC_MAX_ACTIVE_RUNS", "8"))
+# Assumed question duration for wait estimates until real ones are recorded (seconds)
+FABRIC_ADMISSION_DEFAULT_DURATION = float(os.getenv("FABRIC_ADMISSION_DEFAULT_DURATION", "30"))
+
+
+class AdmissionController:
+    """Process-wide limit on concurrently running questions.
+
+    Each user has a FIFO queue, and free slots are handed out round-robin
+    across users, so one user submitting many questions can't starve the
+    others. Waiters are told their position and estimated wait whenever the
+    position changes, via the `on_queue(position, wait_seconds)` callback
+    passed to `slot()`; `on_queue(0, 0)` means the question has been admitted.
+
+    All methods must be called on the same event loop.
+    """
+
+    def __init__(self, max_active=FABRIC_MAX_ACTIVE_RUNS,
+                 default_duration=FABRIC_ADMISSION_DEFAULT_DURATION, history_size=50):
+        self.max_active = max_active
+        self.default_duration = default_duration
+        self.active = 0
+        # user -> deque of waiters, in round-robin order
+        self._queues = OrderedDict()
+        self._durations = deque(maxlen=history_size)
+
+    @property
+    def waiting(self):
+        return sum(len(q) for q in self._queues.values())
+
+    def expected_duration(self):
+        """Median time a question holds a slot (the default until 3 are recorded)."""
+        if len(self._durations) < 3:
+            return self.default_duration
+        return statistics.median(self._durations)
+
+    def estimate_wait(self, position):
+        """Seconds until the waiter at `position` (1-based) is likely admitted."""
+        if self.max_active <= 0:
+            return 0
+        return math.ceil(position / self.max_active) * self.expected_duration()
+
+    @asynccontextmanager
+    async def slot(self, user=None, on_queue=None):
+        """Hold one run slot for the duration of the `async with` block."""
+        with span("queue"):
+            await self._acquire(user, on_queue)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self._release(time.monotonic() - started)
+
+    async def _acquire(self, user, on_queue):
+        if self.max_active <= 0:
+            return
+        if self.active < self.max_active and not self._queues:
+            self.active += 1
+            return
+
+        waiter = {"future": asyncio.get_running_loop().create_future(), "on_queue": on_queue, "position": None}
+        self._queues.setdefault(user, deque()).append(waiter)
+        self._notify()
+        try:
+            await waiter["future"]
+        except asyncio.CancelledError:
+            if waiter["future"].done() and not waiter["future"].cancelled():
+                # Admitted just as we were cancelled - hand the slot on
+                self._release(None)
+            else:
+                self._remove(user, waiter)
+                self._notify()
+            raise
+        if on_queue:
+            on_queue(0, 0)
+
+    def _release(self, duration):
+        if self.max_active <= 0:
+            return
+        if duration is not None:
+            self._durations.append(duration)
+        self.active -= 1
+        self._admit()
+
+    def _remove(self, user, waiter):
+        queue = self._queues.get(user)
+        if queue is not None and waiter in queue:
+            queue.remove(waiter)
+            if not queue:
+                del self._queues[user]
+
+    def _admit(self):
+        admitted = False
+        while self.active < self.max_active and self._queues:
+            user, queue = next(iter(self._queues.items()))
+            waiter = queue.popleft()
+            if queue:
+                self._queues.move_to_end(user)
+            else:
+                del self._queues[user]
+            if waiter["future"].done():
+                continue
+            self.active += 1
+            waiter["future"].set_result(None)
+            admitted = True
+        if admitted:
+            self._notify()
+
+    def _order(self):
+        """Waiters in the order they will be admitted."""
+        queues = [list(q) for q in self._queues.values()]
+        order = []
+        for depth in range(max((len(q) for q in queues), default=0)):
+            order.extend(q[depth] for q in queues if depth < len(q))
+        return order
+
+    def _notify(self):
+        for position, waiter in enumerate(self._order(), 1):
+            if waiter["on_queue"] and waiter["position"] != position:
+                waiter["position"] = position
+                waiter["on_queue"](position, self.estimate_wait(position))
@@ -0,0 +1,81 @@
+import os
+import re
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Answers are reused for this many seconds, and at most this many are kept
+# (least recently used evicted first). Set the TTL to 0 to disable caching.
+FABRIC_ANSWER_CACHE_TTL = int(os.getenv("FABRIC_ANSWER_CACHE_TTL", "3600"))
+FABRIC_ANSWER_CACHE_SIZE = int(os.getenv("FABRIC_ANSWER_CACHE_SIZE", "256"))
+
+
+def normalize_question(question):
+    """Canonical form of a question for cache lookups.
+
+    Case, surrounding/repeated whitespace and trailing punctuation don't
+    change what the agent is asked, so they don't change the key.
+    """
+    text = re.sub(r"\s+", " ", question or "").strip().lower()
+    return text.rstrip(" ?.!")
+
+
+class AnswerCache:
+    """Process-wide TTL + LRU cache of Data Agent answers.
+
+    Keys are `(workspace_id, artifact_id, normalized_question, file_context_hash)`
+    so answers never leak across agents or across different uploaded files.
+    """
+
+    def __init__(self, ttl=FABRIC_ANSWER_CACHE_TTL, max_size=FABRIC_ANSWER_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(workspace_id, artifact_id, question, file_context=""):
+        context_hash = hashlib.sha256((file_context or "").encode("utf-8")).hexdigest()[:16]
+        return (workspace_id, artifact_id, normalize_question(question), context_hash)
+
+    def get(self, key):
+        """Return the cached entry (`{"answer", "created_at"}`) or None."""
+        if self.ttl <= 0:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if time.time() - entry["created_at"] >= self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, answer):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = {"answer": answer, "created_at": time.time()}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# Shared by all sessions in the process
+answer_cache = AnswerCache()
@@ -0,0 +1,176 @@
+import re
+from datetime import datetime
+import pandas as pd
+
+SQL_BLOCK_PATTERN = re.compile(r'```sql\n(.*?)\n```', re.IGNORECASE | re.DOTALL)
+# A simple heuristic for SQL that isn't in a code block: SELECT...FROM patterns
+INLINE_SQL_PATTERN = re.compile(r'(SELECT\s+.+?\s+FROM\s+.+?)(?:\n\n|\Z)', re.IGNORECASE | re.DOTALL)
+
+
+def format_response_with_sql(response):
+    """Extract and format SQL from response for better display.
+    
+    Returns the response with SQL blocks highlighted and potentially
+    extracted into separate code blocks.
+    """
+    # Check if response contains SQL
+    if not response:
+        return response
+    
+    if SQL_BLOCK_PATTERN.search(response):
+        # Response already has SQL code blocks - leave as is
+        return response
+    
+    # Look for inline SQL that might not be in code blocks
+    formatted = response
+    for match in INLINE_SQL_PATTERN.finditer(response):
+        sql = match.group(1).strip()
+        if len(sql) > 50:  # Only format substantial SQL
+            formatted = formatted.replace(sql, f"\n```sql\n{sql}\n```\n")
+    
+    return formatted
+
+
+TABLE_ROW_PATTERN = re.compile(r'^\s*\|.*\|\s*$')
+DIVIDER_CELL_PATTERN = re.compile(r'^:?-+:?$')
+CELL_SPLIT_PATTERN = re.compile(r'(?<!\\)\|')
+# Zero-padded codes (ZIP, ICD, MRN, ...) must stay text
+LEADING_ZERO_PATTERN = re.compile(r'^[-+]?\$?0\d')
+NUMBER_CLEANUP_PATTERN = re.compile(r'^\s*\$|[,\s]|%\s*$')
+ISO_DATE_PATTERN = re.compile(r'^\d{4}-\d{2}-\d{2}([ T]\d{2}:\d{2}(:\d{2}(\.\d+)?)?)?$')
+
+
+def _table_cells(line):
+    cells = CELL_SPLIT_PATTERN.split(line.strip())
+    if cells and cells[0] == "":
+        cells = cells[1:]
+    if cells and cells[-1] == "":
+        cells = cells[:-1]
+    return [cell.strip().replace("\\|", "|") for cell in cells]
+
+
+def _is_divider(line):
+    cells = _table_cells(line)
+    return bool(cells) and all(DIVIDER_CELL_PATTERN.match(cell) for cell in cells)
+
+
+def _typed_column(values):
+    """Numbers (thousands separators, $ and % allowed) as numeric, ISO dates as datetimes, anything else as text.
+
+    Returns `(series, number_format)`; the format is a printf-style string that
+    puts back the `$` or `%` the agent wrote, or None.
+    """
+    missing = ("", "-", "N/A", "null", "NULL", "None")
+    present = [v for v in values if v not in missing]
+    if present:
+        if not any(LEADING_ZERO_PATTERN.match(v) for v in present):
+            cleaned = [None if v in missing else NUMBER_CLEANUP_PATTERN.sub("", v) for v in values]
+            numeric = pd.to_numeric(pd.Series(cleaned, dtype="object"), errors="coerce")
+            if numeric.notna().sum() == len(present):
+                return numeric, _number_format(present, [v for v in cleaned if v is not None])
+        if all(ISO_DATE_PATTERN.match(v) for v in present):
+            dates = pd.to_datetime(pd.Series([None if v in missing else v for v in values]), format="ISO8601", errors="coerce")
+            return dates, None
+    return pd.Series(values, dtype="string"), None
+
+
+def _number_format(present, cleaned):
+    prefix = "$" if all(v.startswith("$") for v in present) else ""
+    suffix = "%%" if all(v.endswith("%") for v in present) else ""
+    if not (prefix or suffix):
+        return None
+    decimals = max(len(v.partition(".")[2]) for v in cleaned)
+    return f"{prefix}%.{decimals}f{suffix}"
+
+
+def markdown_table_to_dataframe(lines):
+    """Typed DataFrame from the lines of a markdown table (header, divider, rows)."""
+    header = _table_cells(lines[0])
+    # Duplicate or blank headers would make an invalid frame
+    columns = []
+    for i, name in enumerate(header):
+        name = name.strip("*_ ") or f"Column {i + 1}"
+        while name in columns:
+            name += " "
+        columns.append(name)
+    rows = []
+    for line in lines[2:]:
+        cells = _table_cells(line)
+        rows.append((cells + [""] * len(columns))[:len(columns)])
+    data = {}
+    number_formats = {}
+    for i, name in enumerate(columns):
+        data[name], number_format = _typed_column([row[i] for row in rows])
+        if number_format:
+            number_formats[name] = number_format
+    df = pd.DataFrame(data)
+    # How currency and percentage columns were written, for display
+    df.attrs["number_formats"] = number_formats
+    return df
+
+
+def split_answer(text):
+    """Split an answer into `("markdown", text)` and `("table", DataFrame)` segments.
+
+    Markdown tables (outside code blocks) become typed DataFrames so they can
+    be rendered as interactive tables; everything else stays markdown.
+    """
+    if not text or "|" not in text:
+        return [("markdown", text or "")]
+
+    segments = []
+    lines = text.split("\n")
+    buffer = []
+    in_code = False
+    i = 0
+    while i < len(lines):
+        line = lines[i]
+        if line.lstrip().startswith("```"):
+            in_code = not in_code
+        if (not in_code and TABLE_ROW_PATTERN.match(line) and i + 1 < len(lines)
+                and _is_divider(lines[i + 1])):
+            end = i + 2
+            while end < len(lines) and TABLE_ROW_PATTERN.match(lines[end]):
+                end += 1
+            if buffer:
+                segments.append(("markdown", "\n".join(buffer)))
+                buffer = []
+            segments.append(("table", markdown_table_to_dataframe(lines[i:end])))
+            i = end
+            continue
+        buffer.append(line)
+        i += 1
+    if buffer:
+        segments.append(("markdown", "\n".join(buffer)))
+    return segments
+
+
+def process_uploaded_file(uploaded_file):
+    """Load an uploaded CSV/Excel file. Returns `(df, summary)`, or `(None, error)`."""
+    try:
+        if uploaded_file.name.endswith('.csv'):
+            df = pd.read_csv(uploaded_file)
+        elif uploaded_file.name.endswith(('.xlsx', '.xls')):
+            df = pd.read_excel(uploaded_file)
+        else:
+            return None, "Unsupported file format."
+        summary = f"Shape: {df.shape[0]} rows x {df.shape[1]} columns\nColumns: {', '.join(df.columns.tolist())}\nSample:\n{df.head(3).to_string()}"
+        return df, summary
+    except Exception as e:
+        return None, f"Error: {str(e)}"
+
+
+def build_chat_export(messages, exported_at=None):
+    """Markdown export of a chat history (a list of `{"role", "content"}` dicts)."""
+    exported_at = exported_at or datetime.now()
+    export = f"""# 🏥 Synthea Healthcare Agent - Chat Export
+**Exported:** {exported_at.strftime('%B %d, %Y at %I:%M %p')}
+**Connected to:** Microsoft Fabric Data Agent
+
+---
+
+"""
+    for msg in messages:
+        role = "👤 **User**" if msg["role"] == "user" else "🤖 **Assistant**"
+        export += f"{role}\n\n{msg['content']}\n\n---\n\n"
+    return export
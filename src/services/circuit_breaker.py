@@ -0,0 +1,127 @@
+import os
+import time
+import threading
+from collections import deque
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# The breaker opens on CapacityNotActive, or after FAILURE_THRESHOLD 5xx /
+# network failures within WINDOW seconds. While open, questions fail fast;
+# after COOLDOWN seconds one probe question is let through. The cooldown
+# doubles after each failed probe, up to MAX_COOLDOWN.
+FABRIC_BREAKER_FAILURE_THRESHOLD = int(os.getenv("FABRIC_BREAKER_FAILURE_THRESHOLD", "5"))
+FABRIC_BREAKER_WINDOW = float(os.getenv("FABRIC_BREAKER_WINDOW", "60"))
+FABRIC_BREAKER_COOLDOWN = float(os.getenv("FABRIC_BREAKER_COOLDOWN", "30"))
+FABRIC_BREAKER_MAX_COOLDOWN = float(os.getenv("FABRIC_BREAKER_MAX_COOLDOWN", "300"))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the API while the breaker is open.
+
+    `reason` is the error that opened the breaker and `retry_after` the
+    seconds until the next probe is allowed.
+    """
+
+    def __init__(self, reason, retry_after):
+        super().__init__(f"Circuit open ({reason}); next probe in {retry_after:.0f}s")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Process-wide closed / open / half-open circuit breaker.
+
+    Call `before_call()` before each request (it raises `CircuitOpenError`
+    when the request shouldn't be made), then report the outcome with
+    exactly one of `record_success()`, `record_failure(error)`,
+    `trip(error)` or `release()` (outcome says nothing about the API's
+    health, e.g. the caller was cancelled).
+    """
+
+    def __init__(self, failure_threshold=FABRIC_BREAKER_FAILURE_THRESHOLD, window=FABRIC_BREAKER_WINDOW,
+                 cooldown=FABRIC_BREAKER_COOLDOWN, max_cooldown=FABRIC_BREAKER_MAX_COOLDOWN):
+        self.failure_threshold = failure_threshold
+        self.window = window
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+
+        self.state = CLOSED
+        self.reason = None
+        self.opened_at = None
+        self._current_cooldown = cooldown
+        self._failures = deque()
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def retry_after(self):
+        """Seconds until the next probe is allowed (0 unless open)."""
+        with self._lock:
+            if self.state != OPEN:
+                return 0
+            return max(self.opened_at + self._current_cooldown - time.monotonic(), 0)
+
+    def before_call(self):
+        with self._lock:
+            if self.state == CLOSED:
+                return
+            if self.state == OPEN:
+                remaining = self.opened_at + self._current_cooldown - time.monotonic()
+                if remaining > 0:
+                    raise CircuitOpenError(self.reason, remaining)
+                self.state = HALF_OPEN
+            if self._probing:
+                raise CircuitOpenError(self.reason, 0)
+            # This caller is the single probe
+            self._probing = True
+
+    def record_success(self):
+        with self._lock:
+            if self.state == CLOSED:
+                return
+            print("Fabric circuit breaker closed: the API is responding again")
+            self.state = CLOSED
+            self.reason = None
+            self._current_cooldown = self.cooldown
+            self._failures.clear()
+            self._probing = False
+
+    def record_failure(self, error):
+        """Count a 5xx / network failure; opens the breaker on a burst (or a failed probe)."""
+        with self._lock:
+            now = time.monotonic()
+            if self.state == HALF_OPEN:
+                self._open(error, now, backoff=True)
+                return
+            self._failures.append(now)
+            while self._failures and now - self._failures[0] > self.window:
+                self._failures.popleft()
+            if self.state == CLOSED and len(self._failures) >= self.failure_threshold:
+                self._open(error, now)
+
+    def trip(self, error):
+        """Open the breaker immediately (e.g. the capacity is paused)."""
+        with self._lock:
+            self._open(error, time.monotonic(), backoff=self.state == HALF_OPEN)
+
+    def release(self):
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._probing = False
+
+    def _open(self, error, now, backoff=False):
+        if backoff:
+            self._current_cooldown = min(self._current_cooldown * 2, self.max_cooldown)
+        elif self.state == CLOSED:
+            self._current_cooldown = self.cooldown
+        if self.state != OPEN:
+            print(f"Fabric circuit breaker open for {self._current_cooldown:.0f}s: {error}")
+        self.state = OPEN
+        self.reason = error
+        self.opened_at = now
+        self._failures.clear()
+        self._probing = False
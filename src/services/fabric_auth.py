@@ -0,0 +1,118 @@
+import os
+import time
+import threading
+import msal
+from dotenv import load_dotenv
+
+load_dotenv()
+
+FABRIC_SCOPE = "https://api.fabric.microsoft.com/.default"
+
+# Tokens are refreshed in the background once they are within this many
+# seconds of expiring, and synchronously once within FABRIC_TOKEN_MIN_TTL.
+FABRIC_TOKEN_REFRESH_MARGIN = int(os.getenv("FABRIC_TOKEN_REFRESH_MARGIN", "300"))
+FABRIC_TOKEN_MIN_TTL = int(os.getenv("FABRIC_TOKEN_MIN_TTL", "60"))
+
+
+class FabricTokenProvider:
+    """Expiry-aware, thread-safe access token cache for the Fabric API.
+
+    Keeps a single MSAL ConfidentialClientApplication (or Azure Identity
+    credential) for the life of the process and hands out the cached token
+    until shortly before `expires_on`. Tokens close to expiry are refreshed on
+    a background thread while callers keep using the still-valid one.
+
+    Uses this priority:
+    1. Client Secret (if client_secret is set) - MSAL client credentials flow
+    2. `credential_factory()` - any azure.identity credential (MI / Azure CLI)
+    """
+
+    def __init__(self, tenant_id, client_id, client_secret=None, credential_factory=None,
+                 refresh_margin=FABRIC_TOKEN_REFRESH_MARGIN, min_ttl=FABRIC_TOKEN_MIN_TTL):
+        self.tenant_id = tenant_id
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.credential_factory = credential_factory
+        self.refresh_margin = refresh_margin
+        self.min_ttl = min_ttl
+
+        self._app = None
+        self._credential = None
+        self._token = None
+        self._expires_on = 0.0
+        self._lock = threading.Lock()
+        self._refreshing = False
+
+    def get_token(self):
+        """Return a valid access token, acquiring or refreshing it as needed."""
+        with self._lock:
+            remaining = self._expires_on - time.time()
+            if self._token and remaining > self.refresh_margin:
+                return self._token
+            if self._token and remaining > self.min_ttl:
+                # Still usable - refresh ahead of expiry without blocking the caller
+                if not self._refreshing:
+                    self._refreshing = True
+                    threading.Thread(target=self._background_refresh, daemon=True).start()
+                return self._token
+
+            # Missing or about to expire: refresh synchronously. Holding the lock
+            # means concurrent sessions wait for one AAD request instead of each
+            # making their own.
+            self._token, self._expires_on = self._acquire()
+            return self._token
+
+    def invalidate(self):
+        """Forget the cached token (e.g. after a 401 from the API)."""
+        with self._lock:
+            self._token = None
+            self._expires_on = 0.0
+
+    def _background_refresh(self):
+        try:
+            token, expires_on = self._acquire()
+            with self._lock:
+                self._token, self._expires_on = token, expires_on
+        except Exception as e:
+            # The current token is still valid; the next call retries the refresh
+            print(f"Background Fabric token refresh failed: {e}")
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def _acquire(self):
+        """Request a new token. Returns (access_token, expires_on_epoch_seconds)."""
+        if self.client_secret:
+            if self._app is None:
+                self._app = msal.ConfidentialClientApplication(
+                    self.client_id,
+                    authority=f"https://login.microsoftonline.com/{self.tenant_id}",
+                    client_credential=self.client_secret
+                )
+            result = self._app.acquire_token_for_client(scopes=[FABRIC_SCOPE])
+            if "access_token" not in result:
+                error_msg = result.get("error_description", result.get("error", "Unknown error"))
+                raise Exception(f"MSAL error: {error_msg}")
+            return result["access_token"], time.time() + int(result.get("expires_in", 3600))
+
+        if self._credential is None:
+            if self.credential_factory is None:
+                raise Exception("No client secret or credential configured for Fabric authentication")
+            self._credential = self.credential_factory()
+        token = self._credential.get_token(FABRIC_SCOPE)
+        return token.token, float(token.expires_on)
+
+
+_providers = {}
+_providers_lock = threading.Lock()
+
+
+def get_fabric_token_provider(tenant_id, client_id, client_secret=None, credential_factory=None) -> FabricTokenProvider:
+    """Return the process-wide token provider for this app registration."""
+    key = (tenant_id, client_id, bool(client_secret))
+    with _providers_lock:
+        provider = _providers.get(key)
+        if provider is None:
+            provider = FabricTokenProvider(tenant_id, client_id, client_secret, credential_factory)
+            _providers[key] = provider
+        return provider
@@ -0,0 +1,140 @@
+import os
+import asyncio
+import contextvars
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Thread deletes are batched: a batch is sent once it has BATCH_SIZE threads or
+# FLUSH_INTERVAL seconds after its first thread, whichever comes first. Failed
+# deletes are retried with exponential backoff up to MAX_ATTEMPTS times.
+FABRIC_CLEANUP_BATCH_SIZE = int(os.getenv("FABRIC_CLEANUP_BATCH_SIZE", "10"))
+FABRIC_CLEANUP_FLUSH_INTERVAL = float(os.getenv("FABRIC_CLEANUP_FLUSH_INTERVAL", "1.0"))
+FABRIC_CLEANUP_MAX_ATTEMPTS = int(os.getenv("FABRIC_CLEANUP_MAX_ATTEMPTS", "5"))
+FABRIC_CLEANUP_BACKOFF = float(os.getenv("FABRIC_CLEANUP_BACKOFF", "2.0"))
+
+
+class ThreadCleanupQueue:
+    """Background worker that deletes retired threads off the critical path.
+
+    `enqueue()` returns immediately; a worker task on the same event loop
+    deletes threads in concurrent batches via `delete_fn(thread_id)` (which
+    should raise on failure), retries failures with backoff and can be
+    drained before shutdown so no thread is left behind.
+    """
+
+    def __init__(self, delete_fn, batch_size=FABRIC_CLEANUP_BATCH_SIZE,
+                 flush_interval=FABRIC_CLEANUP_FLUSH_INTERVAL,
+                 max_attempts=FABRIC_CLEANUP_MAX_ATTEMPTS, backoff=FABRIC_CLEANUP_BACKOFF):
+        self.delete_fn = delete_fn
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+
+        self._queue = None
+        self._worker = None
+        self._idle = None
+        self._outstanding = 0
+        self._draining = False
+        self._retries = {}
+
+    @property
+    def outstanding(self):
+        """Threads queued, in flight or waiting to be retried."""
+        return self._outstanding
+
+    def enqueue(self, thread_id):
+        """Schedule `thread_id` for deletion. Must be called on the worker's loop."""
+        self._ensure_worker()
+        self._outstanding += 1
+        self._idle.clear()
+        self._queue.put_nowait((thread_id, 0))
+
+    async def drain(self, timeout=10):
+        """Wait (up to `timeout` seconds) until every queued thread is handled.
+
+        Pending retries are sent immediately rather than after their backoff.
+        Returns True if the queue emptied in time.
+        """
+        if self._worker is None or self._outstanding == 0:
+            return True
+        self._draining = True
+        for item, handle in list(self._retries.items()):
+            handle.cancel()
+            self._requeue(item)
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            print(f"Thread cleanup drain timed out with {self._outstanding} thread(s) outstanding")
+            return False
+        finally:
+            self._draining = False
+
+    async def close(self, timeout=10):
+        """Drain the queue, then stop the worker task."""
+        drained = await self.drain(timeout)
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        return drained
+
+    def _ensure_worker(self):
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._idle = asyncio.Event()
+            self._idle.set()
+            # Fresh context: the worker outlives the question that happened to start it
+            self._worker = asyncio.get_running_loop().create_task(self._run(), context=contextvars.Context())
+
+    def _requeue(self, item):
+        self._retries.pop(item, None)
+        self._queue.put_nowait(item)
+
+    def _done(self, count=1):
+        self._outstanding -= count
+        if self._outstanding <= 0:
+            self._outstanding = 0
+            self._idle.set()
+
+    async def _next_batch(self):
+        batch = [await self._queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + (0 if self._draining else self.flush_interval)
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._next_batch()
+            results = await asyncio.gather(
+                *(self.delete_fn(thread_id) for thread_id, _ in batch), return_exceptions=True
+            )
+            for (thread_id, attempts), result in zip(batch, results):
+                if not isinstance(result, BaseException):
+                    self._done()
+                elif attempts + 1 < self.max_attempts:
+                    item = (thread_id, attempts + 1)
+                    delay = 0 if self._draining else self.backoff * (2 ** attempts)
+                    self._retries[item] = loop.call_later(delay, self._requeue, item)
+                else:
+                    print(f"Giving up deleting thread {thread_id} after {attempts + 1} attempts: {result or type(result).__name__}")
+                    self._done()
@@ -0,0 +1,107 @@
+import time
+import atexit
+import threading
+from services.circuit_breaker import CircuitOpenError
+from services.fabric_auth import get_fabric_token_provider
+from services.fabric_engine import (
+    AssistantGoneError,
+    CapacityNotActiveError,
+    FabricAgentEngine,
+    FabricAgentError,
+    FabricRunFailedError,
+    FabricRunTimeoutError,
+)
+
+# The one entry point to the Data Agent ask flow. The Streamlit page, the
+# test scripts and the benchmarks all get their client here, so they share
+# timeouts, token caching, polling, retries and the rest of the engine.
+
+FABRIC_API_HOST = "https://api.fabric.microsoft.com"
+
+
+def fabric_api_base(workspace_id, artifact_id, override=None):
+    """The Data Agent's OpenAI-compatible endpoint (`override`, e.g. FABRIC_API_BASE, wins if set)."""
+    if override:
+        return override.rstrip("/")
+    return f"{FABRIC_API_HOST}/v1/workspaces/{workspace_id}/dataagents/{artifact_id}/aiassistant/openai"
+
+
+class StaticTokenProvider:
+    """Hands out a fixed bearer token (a pre-acquired token, or anything for the local simulator)."""
+
+    def __init__(self, token):
+        self.token = token
+
+    def get_token(self):
+        return self.token
+
+    def invalidate(self):
+        pass
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_fabric_client(base_url, token_provider, transport=None) -> FabricAgentEngine:
+    """Return the process-wide client for `base_url`, creating it on first use.
+
+    `transport` is any `httpx.AsyncBaseTransport` (e.g. `httpx.MockTransport`
+    or a recording/fault-injecting wrapper) and replaces the pooled network
+    transport. It only applies when the client is created.
+    """
+    base_url = base_url.rstrip("/")
+    with _clients_lock:
+        client = _clients.get(base_url)
+        if client is None:
+            client = FabricAgentEngine(base_url, token_provider, transport=transport)
+            _clients[base_url] = client
+        return client
+
+
+def close_fabric_clients():
+    """Close every client, deleting the threads they still hold.
+
+    Also runs at interpreter exit, but by then Python may already refuse
+    new worker threads, so scripts should call it before they finish.
+    """
+    with _clients_lock:
+        clients = list(_clients.values())
+        _clients.clear()
+    for client in clients:
+        client.close()
+
+
+atexit.register(close_fabric_clients)
+
+
+def ask_for_result(client, question, max_retries=3, on_delta=None):
+    """Ask one self-contained question and report the outcome as a dict instead of raising.
+
+    Success: `{"success": True, "response", "elapsed_time", "thread_id"}`.
+    Failure: `{"success": False, "error", "message", "elapsed_time"}`, where
+    `error` is "CapacityNotActive", "CircuitOpen", "Timeout", the run's
+    `last_error` code, "HTTP <status>" or "Exception". The thread is
+    deleted afterwards.
+    """
+    started = time.monotonic()
+    try:
+        answer, thread_id = client.ask_sync(question, max_retries=max_retries, on_delta=on_delta)
+    except CapacityNotActiveError:
+        result = {"success": False, "error": "CapacityNotActive", "message": "Fabric capacity is paused"}
+    except CircuitOpenError as e:
+        result = {"success": False, "error": "CircuitOpen", "message": str(e)}
+    except FabricRunTimeoutError:
+        result = {"success": False, "error": "Timeout", "message": "Request timed out"}
+    except FabricRunFailedError as e:
+        result = {"success": False, "error": e.error_code or "unknown", "message": e.error_message,
+                  "run_status": e.run_status}
+    except FabricAgentError as e:
+        result = {"success": False, "error": f"HTTP {e.status_code or 'unknown'}", "message": (e.response_text or str(e))[:200]}
+    except Exception as e:
+        result = {"success": False, "error": "Exception", "message": str(e)}
+    else:
+        client.end_conversation_sync(thread_id)
+        result = {"success": True, "response": answer, "thread_id": thread_id}
+    result["elapsed_time"] = time.monotonic() - started
+    return result
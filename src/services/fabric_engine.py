@@ -0,0 +1,666 @@
+import os
+import time
+import queue
+import asyncio
+import threading
+import httpx
+from dotenv import load_dotenv
+from services.admission import FABRIC_MAX_ACTIVE_RUNS, AdmissionController
+from services.circuit_breaker import CLOSED, CircuitBreaker
+from services.fabric_cleanup import ThreadCleanupQueue
+from services.fabric_http import FABRIC_API_VERSION, FABRIC_POOL_MAXSIZE, get_assistant_cache
+from services.fabric_polling import RUN_PENDING_STATES, default_poll_strategy
+from services.fabric_streaming import FABRIC_STREAMING, consume_run_stream, is_event_stream
+from services.keepwarm import WarmthTracker
+from services.single_flight import SingleFlight
+from services.telemetry import collect_phases, current_attempt, record_phase, record_response, span
+
+load_dotenv()
+
+# Longest a single run may take before the question times out (seconds)
+FABRIC_RUN_TIMEOUT = int(os.getenv("FABRIC_RUN_TIMEOUT", "300"))
+# How long shutdown waits for queued thread deletes to finish (seconds)
+FABRIC_CLEANUP_DRAIN_TIMEOUT = float(os.getenv("FABRIC_CLEANUP_DRAIN_TIMEOUT", "10"))
+# Upper bound on open connections across all concurrent questions
+FABRIC_MAX_CONNECTIONS = int(os.getenv("FABRIC_MAX_CONNECTIONS", "100"))
+# Follow-up questions reuse the conversation's thread until it is this old
+# (seconds) or has answered this many questions (1 disables reuse)
+FABRIC_THREAD_MAX_AGE = int(os.getenv("FABRIC_THREAD_MAX_AGE", "1800"))
+FABRIC_THREAD_MAX_TURNS = int(os.getenv("FABRIC_THREAD_MAX_TURNS", "10"))
+# Messages requested per page when fetching an answer (only messages after the question are fetched)
+FABRIC_MESSAGES_PAGE_SIZE = int(os.getenv("FABRIC_MESSAGES_PAGE_SIZE", "20"))
+
+# Run fields holding when the run reached a terminal state (Unix seconds)
+RUN_ENDED_AT_FIELDS = ("completed_at", "failed_at", "cancelled_at", "expired_at")
+
+
+class FabricAgentError(Exception):
+    """An error response from the Data Agent API that the caller should surface."""
+
+    def __init__(self, message, status_code=None, response_text="", thread_id=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.response_text = response_text
+        self.thread_id = thread_id
+
+
+class CapacityNotActiveError(FabricAgentError):
+    """The Fabric capacity is paused or not running."""
+
+
+class AssistantGoneError(FabricAgentError):
+    """The cached assistant no longer exists (404/410 on run creation)."""
+
+
+class FabricRunTimeoutError(FabricAgentError):
+    """The run did not finish within the run timeout."""
+
+
+class FabricRunFailedError(FabricAgentError):
+    """The run finished in a state other than `completed`."""
+
+    def __init__(self, run_status, last_error, thread_id=None, assistant_id=None):
+        self.run_status = run_status
+        self.error_code = last_error.get("code", "") if isinstance(last_error, dict) else ""
+        self.error_message = last_error.get("message", str(last_error)) if isinstance(last_error, dict) else str(last_error)
+        self.assistant_id = assistant_id
+        super().__init__(f"Run {run_status}: {self.error_message}", thread_id=thread_id)
+
+
+class FabricAgentEngine:
+    """Asyncio implementation of the Data Agent ask flow.
+
+    `ask()` is a coroutine, so many questions can wait on the API concurrently
+    on one event loop instead of each holding a server thread in
+    `time.sleep`. Synchronous callers (the Streamlit page) use `ask_sync()`,
+    which runs the coroutine on the engine's background loop.
+
+    An engine's HTTP client is bound to the loop that first uses it, so drive
+    a given engine either from your own loop (`await ask()`) or through
+    `ask_sync()`, not both.
+    """
+
+    def __init__(self, base_url, token_provider, api_version=FABRIC_API_VERSION,
+                 max_connections=FABRIC_MAX_CONNECTIONS, max_keepalive=FABRIC_POOL_MAXSIZE,
+                 run_timeout=FABRIC_RUN_TIMEOUT, poll_strategy=default_poll_strategy,
+                 streaming=FABRIC_STREAMING, thread_max_age=FABRIC_THREAD_MAX_AGE,
+                 thread_max_turns=FABRIC_THREAD_MAX_TURNS, max_active_runs=FABRIC_MAX_ACTIVE_RUNS,
+                 messages_page_size=FABRIC_MESSAGES_PAGE_SIZE, transport=None):
+        self.base_url = base_url.rstrip("/")
+        self.token_provider = token_provider
+        self.api_version = api_version
+        self.limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive)
+        self.run_timeout = run_timeout
+        self.poll_strategy = poll_strategy
+        self.streaming = streaming
+        self.transport = transport
+        self.thread_max_age = thread_max_age
+        self.thread_max_turns = thread_max_turns
+        self.messages_page_size = messages_page_size
+        self.assistants = get_assistant_cache(self.base_url)
+        # Live conversation threads: thread_id -> {"created_at", "turns", "last_message_id"}.
+        # Only touched from coroutines on the engine's loop.
+        self._threads = {}
+        # Retired threads are deleted in the background, after the answer is returned
+        self.cleanup = ThreadCleanupQueue(self._delete_thread)
+        # Limits concurrent questions, queueing the rest fairly per user
+        self.admission = AdmissionController(max_active_runs)
+        # Fails questions fast while the capacity is paused or erroring
+        self.breaker = CircuitBreaker()
+        # When the agent was last used, and cold vs. warm latency
+        self.warmth = WarmthTracker()
+        # Identical questions asked at the same time share one run
+        self.flights = SingleFlight()
+
+        self._client = None
+        self._assistant_lock = None
+        self._loop = None
+        self._loop_lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # Event loop / client lifecycle
+    # ------------------------------------------------------------------
+
+    def _ensure_loop(self):
+        with self._loop_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name="fabric-agent-engine", daemon=True).start()
+            return self._loop
+
+    def submit(self, coro):
+        """Schedule `coro` on the engine's background loop; returns a concurrent Future."""
+        return asyncio.run_coroutine_threadsafe(coro, self._ensure_loop())
+
+    def _get_client(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                limits=self.limits,
+                timeout=30,
+                transport=self.transport
+            )
+            self._assistant_lock = asyncio.Lock()
+        return self._client
+
+    async def aclose(self, drain_timeout=FABRIC_CLEANUP_DRAIN_TIMEOUT):
+        """Retire all live threads, wait for pending deletes, then close the client."""
+        for thread_id in list(self._threads):
+            self._retire_thread(thread_id)
+        await self.cleanup.close(drain_timeout)
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def close(self):
+        """Drain cleanup, close the HTTP client and stop the background loop, if started."""
+        if self._loop is None:
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self.aclose(), self._loop).result(timeout=FABRIC_CLEANUP_DRAIN_TIMEOUT + 5)
+        except Exception as e:
+            print(f"Error closing Fabric agent engine: {e}")
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+    # ------------------------------------------------------------------
+    # HTTP helpers
+    # ------------------------------------------------------------------
+
+    def _headers(self, token):
+        return {
+            "Authorization": f"Bearer {token}",
+            "Content-Type": "application/json",
+            "Accept": "application/json",
+        }
+
+    def _params(self, extra=None):
+        params = {"api-version": self.api_version}
+        params.update(extra or {})
+        return params
+
+    async def _request(self, method, path, token, params=None, **kwargs):
+        resp = await self._get_client().request(
+            method, path, headers=self._headers(token), params=self._params(params), **kwargs
+        )
+        record_response(resp)
+        return resp
+
+    def _raise_for_status(self, resp, thread_id=None):
+        if resp.status_code < 400:
+            return
+        text = resp.text
+        if "CapacityNotActive" in text:
+            raise CapacityNotActiveError("Fabric capacity is paused", resp.status_code, text, thread_id)
+        raise FabricAgentError(f"HTTP {resp.status_code}", resp.status_code, text, thread_id)
+
+    def _raise_for_run_status(self, resp, thread_id, assistant_id):
+        if resp.status_code in (404, 410) and "CapacityNotActive" not in resp.text:
+            # The cached assistant is gone - drop it so the retry creates a fresh one
+            self.assistants.invalidate(assistant_id)
+            raise AssistantGoneError(f"HTTP {resp.status_code}", resp.status_code, resp.text, thread_id)
+        self._raise_for_status(resp, thread_id)
+
+    # ------------------------------------------------------------------
+    # Ask flow
+    # ------------------------------------------------------------------
+
+    async def ask(self, question, thread_id=None, max_retries=3, on_delta=None, user_id=None, on_queue=None,
+                  source="question", stats=None):
+        """Ask the Data Agent one question.
+
+        Pass the `thread_id` returned for the previous question to ask a
+        follow-up on the same thread; a fresh thread is used instead if that
+        one is unknown, too old, has reached its turn limit or can't take
+        another message.
+
+        Each attempt waits for a slot from the engine's admission controller,
+        queued fairly per `user_id`; `on_queue(position, wait_seconds)` is
+        called while it waits (and with `(0, 0)` once admitted).
+
+        Returns `(answer_text, thread_id)`. Raises `FabricAgentError` (or one
+        of its subclasses) for API errors, failed runs and timeouts once
+        retries are exhausted. Transient 5xx and network errors are retried
+        with exponential backoff. A 401 drops the cached token and retries
+        once with a new one.
+
+        Outcomes feed the engine's circuit breaker. While it is open (the
+        capacity is paused or the API keeps failing) `CircuitOpenError` is
+        raised straight away, before queueing for a slot or retrying.
+
+        Successful questions are recorded in `warmth` under `source`, as cold
+        or warm depending on how long the agent had been idle.
+
+        Every step is timed as a telemetry span (see services/telemetry.py),
+        under an "ask" span covering the whole question. Pass a `stats` dict
+        to get this question's `phases` (seconds per phase) and `attempts`.
+        """
+        idle = self.warmth.idle_for()
+        started = time.monotonic()
+        phases = stats.setdefault("phases", {}) if stats is not None else None
+        with collect_phases(phases), span("ask", **{"fabric.source": source}) as ask_span:
+            try:
+                result = await self._ask_with_retries(question, thread_id, max_retries, on_delta, user_id, on_queue, ask_span)
+            finally:
+                if stats is not None:
+                    stats["attempts"] = ask_span.attributes.get("fabric.attempts", 1)
+        self.warmth.record(source, time.monotonic() - started, idle)
+        return result
+
+    async def _ask_with_retries(self, question, thread_id, max_retries, on_delta, user_id, on_queue, ask_span):
+        token_refreshed = False
+        attempt = 0
+        while attempt < max_retries:
+            last_attempt = attempt == max_retries - 1
+            current_attempt.set(attempt + 1)
+            ask_span.set("fabric.attempts", attempt + 1)
+            self.breaker.before_call()
+            try:
+                async with self.admission.slot(user_id, on_queue):
+                    result = await self._ask_once(question, thread_id, on_delta)
+                self.breaker.record_success()
+                return result
+            except AssistantGoneError:
+                self.breaker.record_success()
+                if last_attempt:
+                    raise
+            except CapacityNotActiveError as e:
+                self.breaker.trip(e)
+                raise
+            except (FabricRunTimeoutError, FabricRunFailedError):
+                self.breaker.record_success()  # The API answered; the run itself failed
+                raise
+            except FabricAgentError as e:
+                if e.status_code == 401 and not token_refreshed:
+                    # Token revoked or expired early - retry once with a fresh one
+                    token_refreshed = True
+                    self.breaker.record_success()
+                    self.token_provider.invalidate()
+                    continue
+                if not (e.status_code and e.status_code >= 500):
+                    self.breaker.record_success()
+                    raise
+                self.breaker.record_failure(e)
+                if last_attempt or self.breaker.state != CLOSED:
+                    raise
+                await self._backoff(attempt)
+            except httpx.TransportError as e:
+                self.breaker.record_failure(e)
+                if last_attempt or self.breaker.state != CLOSED:
+                    raise
+                if not isinstance(e, httpx.TimeoutException):
+                    await self._backoff(attempt)
+            except Exception:
+                self.breaker.release()
+                if last_attempt:
+                    raise
+                await self._backoff(attempt)
+            except BaseException:
+                self.breaker.release()  # Cancelled
+                raise
+            attempt += 1
+
+        raise FabricAgentError("Failed after multiple retry attempts")
+
+    @staticmethod
+    def _record_run_phases(run, start_time, started_at):
+        """Split a finished run into its `run_queue` and `run_execute` phases.
+
+        `started_at` is when the run was first seen `in_progress`. A run that
+        went from queued to done between two polls was never seen running, so
+        it is split by its own `created_at`/`started_at`/`*_at` timestamps
+        (whole seconds) if it has them, and not at all otherwise.
+        """
+        if started_at is not None:
+            record_phase("run_queue", started_at - start_time)
+            record_phase("run_execute", time.monotonic() - started_at)
+            return
+        ended_at = next((run[key] for key in RUN_ENDED_AT_FIELDS if run.get(key)), None)
+        if run.get("created_at") and run.get("started_at") and ended_at:
+            record_phase("run_queue", run["started_at"] - run["created_at"])
+            record_phase("run_execute", ended_at - run["started_at"])
+
+    async def _backoff(self, attempt):
+        with span("retry_backoff"):
+            await asyncio.sleep((2 ** attempt) * 2)  # Exponential backoff: 2, 4, 8 seconds
+
+    async def _ask_once(self, question, thread_id=None, on_delta=None):
+        with span("token"):
+            token = await asyncio.to_thread(self.token_provider.get_token)
+
+        # Step 1: Get the (cached) assistant ID
+        assistant_id = await self._get_assistant_id(token)
+
+        # Steps 2-3: Add the message to the conversation's live thread, or a new one
+        thread_id = await self._post_question(token, question, thread_id)
+
+        try:
+            start_time = time.monotonic()
+            started_at = []
+
+            def on_status(status):
+                # The run left the capacity's queue once it is seen running
+                if status == "in_progress" and not started_at:
+                    started_at.append(time.monotonic())
+
+            with span("run") as run_span:
+                # Step 4: Create a run (streamed when a delta callback is given)
+                run, answer = await self._create_run(token, thread_id, assistant_id, on_delta, on_status)
+                run_id = run.get("id")
+                run_status = run.get("status")
+                on_status(run_status)
+                run_span.set("fabric.run.streamed", answer is not None)
+
+                # Step 5: Poll for completion if the run is still pending
+                polls = 0
+                while run_status in RUN_PENDING_STATES:
+                    elapsed = time.monotonic() - start_time
+                    if elapsed > self.run_timeout:
+                        raise FabricRunTimeoutError("Request timed out", thread_id=thread_id)
+                    delay = self.poll_strategy.next_delay(elapsed, polls)
+                    await asyncio.sleep(min(delay, max(self.run_timeout - elapsed, 0.05)))
+                    polls += 1
+
+                    resp = await self._request("GET", f"/threads/{thread_id}/runs/{run_id}", token, timeout=30)
+                    self._raise_for_status(resp, thread_id)
+                    run = resp.json()
+                    run_status = run.get("status")
+                    on_status(run_status)
+
+                run_span.set("fabric.run.status", run_status)
+                run_span.set("fabric.run.polls", polls)
+                self._record_run_phases(run, start_time, started_at[0] if started_at else None)
+                if run_status != "completed":
+                    raise FabricRunFailedError(run_status, run.get("last_error", {}), thread_id, assistant_id)
+            self.poll_strategy.record(time.monotonic() - start_time)
+
+            # Step 6: Get the answer (already have it if it was streamed)
+            if not answer:
+                answer = await self._fetch_answer(token, thread_id)
+        except BaseException:
+            # A thread whose run failed or may still be active can't take follow-ups
+            self._retire_thread(thread_id)
+            raise
+        finally:
+            info = self._threads.get(thread_id)
+            if info is not None:
+                info["runs"] -= 1
+
+        # Step 7: Keep the thread for follow-ups, or clean it up once it's used up
+        info = self._threads.get(thread_id)
+        if info is not None:
+            info["turns"] += 1
+        if not self._thread_is_live(thread_id):
+            self._retire_thread(thread_id)
+
+        return answer, thread_id
+
+    async def ask_shared(self, key, question, thread_id=None, max_retries=3, on_delta=None,
+                         user_id=None, on_queue=None, stats=None, source="question"):
+        """Like `ask()`, but joins an identical question already in flight.
+
+        Questions with the same `key` (e.g. an answer cache key) that are
+        asked while one is running wait for that run and share its answer or
+        error instead of starting their own. Only use this for questions whose
+        answer doesn't depend on the conversation so far.
+
+        Callers that joined another caller's run get their own `thread_id`
+        back unchanged, since the answer was produced on a different thread.
+        `stats["shared"]` tells which case applied.
+        """
+        if stats is not None:
+            stats["shared"] = self.flights.in_flight(key)
+        (answer, new_thread_id), shared = await self.flights.run(
+            key,
+            lambda fan_out: self.ask(question, thread_id, max_retries, fan_out, user_id, on_queue, source, stats),
+            on_delta
+        )
+        return answer, thread_id if shared else new_thread_id
+
+    def _thread_is_live(self, thread_id):
+        info = self._threads.get(thread_id)
+        return (
+            info is not None
+            and info["turns"] < self.thread_max_turns
+            and time.monotonic() - info["created_at"] < self.thread_max_age
+        )
+
+    async def _post_question(self, token, question, thread_id=None):
+        """Add `question` to `thread_id` if it is still live, else to a new thread.
+
+        Returns the ID of the thread the question was posted to, counted as
+        having one more run in flight until the caller is done with it.
+        """
+        message = {"role": "user", "content": question}
+
+        if thread_id and self._thread_is_live(thread_id):
+            info = self._threads[thread_id]
+            info["runs"] += 1  # Other questions mustn't expire it while it's in use
+            try:
+                with span("message_post", **{"fabric.thread.reused": True}):
+                    resp = await self._request("POST", f"/threads/{thread_id}/messages", token, json=message, timeout=30)
+            except BaseException:
+                info["runs"] -= 1
+                raise
+            if resp.status_code < 400:
+                info["last_message_id"] = resp.json().get("id")
+                return thread_id
+            info["runs"] -= 1
+            if resp.status_code >= 500 or resp.status_code == 401 or "CapacityNotActive" in resp.text:
+                self._raise_for_status(resp, thread_id)
+            # Thread deleted server-side or still busy - fall back to a fresh one
+        if thread_id:
+            self._retire_thread(thread_id)
+        self._retire_expired_threads()
+
+        # Step 2: Create a thread
+        with span("thread_create"):
+            resp = await self._request("POST", "/threads", token, json={}, timeout=30)
+            self._raise_for_status(resp)
+        thread_id = resp.json().get("id")
+        self._threads[thread_id] = {"created_at": time.monotonic(), "turns": 0, "runs": 1}
+
+        # Step 3: Add message to thread
+        with span("message_post", **{"fabric.thread.reused": False}):
+            resp = await self._request("POST", f"/threads/{thread_id}/messages", token, json=message, timeout=30)
+            if resp.status_code >= 400:
+                self._retire_thread(thread_id)
+            self._raise_for_status(resp, thread_id)
+        self._threads[thread_id]["last_message_id"] = resp.json().get("id")
+        return thread_id
+
+    def _retire_thread(self, thread_id):
+        """Stop using `thread_id` for follow-ups and queue it for deletion if we created it."""
+        if self._threads.pop(thread_id, None) is not None:
+            self.cleanup.enqueue(thread_id)
+
+    def _retire_expired_threads(self):
+        # Threads of conversations that were abandoned rather than ended;
+        # threads with a run in flight are left to the question using them
+        now = time.monotonic()
+        expired = [
+            tid for tid, info in self._threads.items()
+            if now - info["created_at"] >= self.thread_max_age and not info["runs"]
+        ]
+        for thread_id in expired:
+            self._retire_thread(thread_id)
+
+    async def _get_assistant_id(self, token):
+        assistant_id = self.assistants.peek()
+        if assistant_id:
+            return assistant_id
+
+        self._get_client()
+        async with self._assistant_lock:
+            # Another question may have created it while we waited
+            assistant_id = self.assistants.peek()
+            if assistant_id:
+                return assistant_id
+            with span("assistant_create"):
+                resp = await self._request("POST", "/assistants", token, json={"model": "not used"}, timeout=60)
+                self._raise_for_status(resp)
+            assistant_id = resp.json().get("id")
+            self.assistants.store(assistant_id)
+            return assistant_id
+
+    async def _create_run(self, token, thread_id, assistant_id, on_delta=None, on_status=None):
+        """Create the run. Returns `(run, streamed_answer_or_None)`.
+
+        `on_status(status)` is called as streamed run status changes arrive.
+        """
+        if on_delta is not None and self.streaming:
+            client = self._get_client()
+            request = client.build_request(
+                "POST", f"/threads/{thread_id}/runs",
+                headers=self._headers(token),
+                params=self._params(),
+                json={"assistant_id": assistant_id, "stream": True},
+                timeout=httpx.Timeout(30, read=self.run_timeout)
+            )
+            resp = await client.send(request, stream=True)
+            try:
+                if resp.status_code < 400 and is_event_stream(resp):
+                    return await consume_run_stream(resp, on_delta, on_status)
+                await resp.aread()
+                # 400 means streaming isn't accepted here - fall through to a regular run
+                if resp.status_code != 400:
+                    self._raise_for_run_status(resp, thread_id, assistant_id)
+                    return resp.json(), None
+            finally:
+                await resp.aclose()
+                record_response(resp)
+
+        resp = await self._request(
+            "POST", f"/threads/{thread_id}/runs", token,
+            json={"assistant_id": assistant_id}, timeout=30
+        )
+        self._raise_for_run_status(resp, thread_id, assistant_id)
+        return resp.json(), None
+
+    async def _fetch_answer(self, token, thread_id):
+        """Return the text of the last assistant message after the thread's cursor.
+
+        The cursor is the ID of the last message seen on the thread (normally
+        the question just posted), so only the new messages are fetched,
+        `FABRIC_MESSAGES_PAGE_SIZE` at a time, however long the conversation.
+        Without a cursor the whole thread is read.
+        """
+        info = self._threads.get(thread_id) or {}
+        cursor = info.get("last_message_id")
+        answer = ""
+        with span("message_fetch") as fetch_span:
+            pages = 0
+            while True:
+                params = {"order": "asc", "limit": self.messages_page_size}
+                if cursor:
+                    params["after"] = cursor
+                resp = await self._request("GET", f"/threads/{thread_id}/messages", token, params=params, timeout=30)
+                self._raise_for_status(resp, thread_id)
+                pages += 1
+                page = resp.json()
+                messages = page.get("data", [])
+
+                # Find assistant's response (last message from assistant)
+                for msg in messages:
+                    if msg.get("role") == "assistant":
+                        for content in msg.get("content", []):
+                            if content.get("type") == "text":
+                                answer = content.get("text", {}).get("value", "")
+                next_cursor = page.get("last_id") or (messages[-1].get("id") if messages else None)
+                if not page.get("has_more") or not next_cursor or next_cursor == cursor:
+                    cursor = next_cursor or cursor
+                    break
+                cursor = next_cursor
+            fetch_span.set("fabric.messages.pages", pages)
+
+        if thread_id in self._threads and cursor:
+            self._threads[thread_id]["last_message_id"] = cursor
+        return answer
+
+    async def _delete_thread(self, thread_id):
+        """Delete one thread; used by the cleanup queue, which retries on error."""
+        with span("thread_delete"):
+            token = await asyncio.to_thread(self.token_provider.get_token)
+            resp = await self._request("DELETE", f"/threads/{thread_id}", token, timeout=10)
+            if resp.status_code >= 400 and resp.status_code != 404:  # 404: already gone
+                raise FabricAgentError(f"HTTP {resp.status_code}", resp.status_code, resp.text, thread_id)
+
+    async def probe(self, path, timeout=10):
+        """Send one GET to `path` (relative to the agent endpoint) and return the response.
+
+        For health checks and keep-warm pings; doesn't raise on HTTP errors.
+        """
+        with span("probe", **{"http.route": path}):
+            token = await asyncio.to_thread(self.token_provider.get_token)
+            return await self._request("GET", path, token, timeout=timeout)
+
+    async def end_conversation(self, thread_id):
+        """Release a conversation's thread (e.g. when the user starts over)."""
+        self._retire_thread(thread_id)
+
+    # ------------------------------------------------------------------
+    # Sync shim
+    # ------------------------------------------------------------------
+
+    def ask_sync(self, question, thread_id=None, max_retries=3, on_delta=None, flight_key=None,
+                 user_id=None, on_queue=None, stats=None):
+        """Blocking wrapper around `ask()` for synchronous callers.
+
+        The coroutine runs on the engine's shared background loop. `on_delta`
+        and `on_queue` are invoked on the *calling* thread (Streamlit elements
+        can only be updated from the script thread), with updates coalesced
+        so a slow caller only sees the latest of each.
+
+        With a `flight_key`, the question goes through `ask_shared()` and
+        joins an identical question already in flight.
+
+        A `stats` dict is filled as described for `ask()`, plus `outcome`:
+        "ok" or the name of the exception raised.
+        """
+        events = queue.SimpleQueue() if (on_delta or on_queue) else None
+        delta_cb = (lambda text: events.put(("delta", text))) if on_delta else None
+        queue_cb = (lambda position, wait: events.put(("queue", (position, wait)))) if on_queue else None
+        if flight_key is None:
+            coro = self.ask(question, thread_id, max_retries, delta_cb, user_id, queue_cb, stats=stats)
+        else:
+            coro = self.ask_shared(flight_key, question, thread_id, max_retries, delta_cb, user_id, queue_cb, stats=stats)
+        future = self.submit(coro)
+        if events is None:
+            return self._sync_result(future, stats)
+
+        # Wake the loop below as soon as the answer is ready
+        future.add_done_callback(lambda f: events.put(("done", None)))
+        done = False
+        while not done:
+            kind, value = events.get()
+            latest = {kind: value}
+            while not events.empty():
+                kind, value = events.get_nowait()
+                latest.pop(kind, None)
+                latest[kind] = value
+            done = "done" in latest
+            latest.pop("done", None)
+            for kind, value in latest.items():
+                if kind == "queue":
+                    on_queue(*value)
+                else:
+                    on_delta(value)
+        return self._sync_result(future, stats)
+
+    @staticmethod
+    def _sync_result(future, stats):
+        try:
+            result = future.result()
+        except BaseException as e:
+            if stats is not None:
+                stats["outcome"] = type(e).__name__
+            raise
+        if stats is not None:
+            stats["outcome"] = "ok"
+        return result
+
+    def end_conversation_sync(self, thread_id):
+        """Blocking wrapper around `end_conversation()`."""
+        if self._loop is None:
+            return
+        self.submit(self.end_conversation(thread_id)).result(timeout=30)
+
@@ -0,0 +1,64 @@
+import os
+import time
+import threading
+from dotenv import load_dotenv
+
+load_dotenv()
+
+FABRIC_API_VERSION = "2024-07-01-preview"
+
+# Keep-alive connections kept open to the Data Agent host
+FABRIC_POOL_MAXSIZE = int(os.getenv("FABRIC_POOL_MAXSIZE", "32"))
+
+# How long a created assistant ID is reused before a new one is created (seconds)
+FABRIC_ASSISTANT_TTL = int(os.getenv("FABRIC_ASSISTANT_TTL", "3600"))
+
+
+class FabricAssistantCache:
+    """Lazily created, TTL-bound assistant ID shared by all questions.
+
+    The Data Agent assistant is stateless from the caller's point of view, so
+    one ID can serve every run until it expires or the service reports it gone
+    (404/410), at which point `invalidate()` forces a new one on next use.
+    One cache exists per API base URL.
+    """
+
+    def __init__(self, ttl=FABRIC_ASSISTANT_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._assistant_id = None
+        self._created_at = 0.0
+
+    def peek(self):
+        """Return the cached assistant ID if it is still fresh, else None."""
+        with self._lock:
+            if self._assistant_id and time.monotonic() - self._created_at < self.ttl:
+                return self._assistant_id
+            return None
+
+    def store(self, assistant_id):
+        with self._lock:
+            self._assistant_id = assistant_id
+            self._created_at = time.monotonic()
+
+    def invalidate(self, assistant_id=None):
+        """Drop the cached ID (only if it still matches `assistant_id`, when given)."""
+        with self._lock:
+            if assistant_id is None or assistant_id == self._assistant_id:
+                self._assistant_id = None
+                self._created_at = 0.0
+
+
+_assistant_caches = {}
+_assistant_caches_lock = threading.Lock()
+
+
+def get_assistant_cache(base_url) -> FabricAssistantCache:
+    """Return the process-wide assistant ID cache for `base_url`."""
+    with _assistant_caches_lock:
+        cache = _assistant_caches.get(base_url)
+        if cache is None:
+            cache = FabricAssistantCache()
+            _assistant_caches[base_url] = cache
+        return cache
+
@@ -0,0 +1,85 @@
+import os
+import random
+import statistics
+import threading
+from collections import deque
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Run-status polling: start at POLL_INITIAL seconds, grow by POLL_MULTIPLIER per
+# poll up to POLL_MAX, with +/- POLL_JITTER (fraction) randomisation.
+FABRIC_POLL_INITIAL = float(os.getenv("FABRIC_POLL_INITIAL", "0.5"))
+FABRIC_POLL_MAX = float(os.getenv("FABRIC_POLL_MAX", "5"))
+FABRIC_POLL_MULTIPLIER = float(os.getenv("FABRIC_POLL_MULTIPLIER", "1.5"))
+FABRIC_POLL_JITTER = float(os.getenv("FABRIC_POLL_JITTER", "0.2"))
+# Learn from recent run durations (0 disables)
+FABRIC_POLL_HISTORY = int(os.getenv("FABRIC_POLL_HISTORY", "50"))
+
+# Run states that mean "keep polling"
+RUN_PENDING_STATES = ("queued", "in_progress")
+
+
+class PollingStrategy:
+    """Adaptive delay schedule for polling `/runs/{run_id}`.
+
+    Polls quickly at first so short runs are picked up promptly, then backs off
+    exponentially (with jitter, capped at `ceiling`) so slow runs cost fewer
+    status GETs. When enough run durations have been recorded it also skips
+    polls that are very unlikely to see a finished run and polls briskly
+    around the typical completion time.
+    """
+
+    def __init__(self, initial=FABRIC_POLL_INITIAL, ceiling=FABRIC_POLL_MAX,
+                 multiplier=FABRIC_POLL_MULTIPLIER, jitter=FABRIC_POLL_JITTER,
+                 history_size=FABRIC_POLL_HISTORY, min_samples=3):
+        self.initial = initial
+        self.ceiling = ceiling
+        self.multiplier = multiplier
+        self.jitter = jitter
+        self.min_samples = min_samples
+        self._durations = deque(maxlen=history_size) if history_size > 0 else None
+        self._lock = threading.Lock()
+
+    def record(self, duration):
+        """Record how long a completed run took, in seconds."""
+        if self._durations is None:
+            return
+        with self._lock:
+            self._durations.append(duration)
+
+    def expected_duration(self):
+        """Median of recent run durations, or None until enough are recorded."""
+        if self._durations is None:
+            return None
+        with self._lock:
+            if len(self._durations) < self.min_samples:
+                return None
+            return statistics.median(self._durations)
+
+    def next_delay(self, elapsed, polls):
+        """Seconds to wait before the next status poll.
+
+        :param elapsed: Seconds since the run was created.
+        :param polls: Number of status polls already made for this run.
+        """
+        delay = min(self.ceiling, self.initial * (self.multiplier ** polls))
+
+        expected = self.expected_duration()
+        if expected is not None:
+            lead = expected * 0.6 - elapsed
+            if lead > delay:
+                # Too early for a typical run to be done - skip ahead
+                delay = min(lead, self.ceiling)
+            elif abs(elapsed - expected) <= expected * 0.5:
+                # Around the usual completion time - poll briskly
+                delay = min(delay, self.initial * 2)
+
+        if self.jitter:
+            delay *= random.uniform(1 - self.jitter, 1 + self.jitter)
+        return max(0.05, delay)
+
+
+# Shared by all sessions in the process so the learned durations reflect
+# everyone's recent runs
+default_poll_strategy = PollingStrategy()
@@ -0,0 +1,142 @@
+import os
+import json
+import httpx
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Create runs with stream=true and render text deltas as they arrive
+FABRIC_STREAMING = os.getenv("FABRIC_STREAMING", "true").lower() in ("1", "true", "yes")
+
+# Run states after which no more events will arrive for the run
+RUN_TERMINAL_STATES = ("completed", "failed", "cancelled", "expired", "incomplete")
+
+
+def is_event_stream(resp):
+    """True if the response is a server-sent event stream rather than JSON."""
+    return resp.headers.get("Content-Type", "").startswith("text/event-stream")
+
+
+def iter_sse_events(lines):
+    """Parse server-sent events from an iterable of decoded lines.
+
+    Yields `(event, data)` tuples where `data` is the decoded JSON payload (or
+    the raw string when it isn't JSON, e.g. the `[DONE]` sentinel).
+    """
+    event = None
+    data_lines = []
+    for line in lines:
+        if line is None:
+            continue
+        if line == "":
+            if data_lines:
+                raw = "\n".join(data_lines)
+                try:
+                    data = json.loads(raw)
+                except ValueError:
+                    data = raw
+                yield event or "message", data
+            event = None
+            data_lines = []
+        elif line.startswith(":"):
+            continue  # comment / keep-alive
+        elif line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            data_lines.append(line[len("data:"):].lstrip())
+
+    if data_lines:
+        raw = "\n".join(data_lines)
+        try:
+            data = json.loads(raw)
+        except ValueError:
+            data = raw
+        yield event or "message", data
+
+
+def _message_text(message):
+    """Concatenate the text content blocks of an assistant message object."""
+    parts = []
+    for content in message.get("content", []):
+        if content.get("type") == "text":
+            parts.append(content.get("text", {}).get("value", ""))
+    return "".join(parts)
+
+
+class RunStreamState:
+    """Accumulates a run's state and answer text from its stream events."""
+
+    def __init__(self):
+        self.run = {}
+        self.text = ""
+        self.completed_text = None
+        self.done = False
+
+    def handle(self, event, data):
+        """Apply one event. Returns True if the text changed."""
+        if event == "done" or data == "[DONE]":
+            self.done = True
+        elif event.startswith("thread.run.step."):
+            pass  # Run-step events share the prefix but carry a step (id "step_..."), not the run
+        elif event.startswith("thread.run.") and isinstance(data, dict) and data.get("object", "thread.run") == "thread.run":
+            self.run = data
+        elif event == "thread.message.delta" and isinstance(data, dict):
+            for content in data.get("delta", {}).get("content", []):
+                if content.get("type") == "text":
+                    self.text += content.get("text", {}).get("value", "")
+            return True
+        elif event == "thread.message.completed" and isinstance(data, dict):
+            if data.get("role") == "assistant":
+                self.completed_text = _message_text(data)
+        elif event == "error":
+            error = data.get("error", data) if isinstance(data, dict) else {"message": str(data)}
+            self.run = {**self.run, "status": "failed", "last_error": error}
+            self.done = True
+        return False
+
+    @property
+    def answer(self):
+        return self.completed_text if self.completed_text is not None else self.text
+
+
+async def consume_run_stream(resp, on_delta=None, on_status=None):
+    """Read an Assistants-style run event stream (an httpx streaming response) to the end.
+
+    Calls `on_delta(text_so_far)` as `thread.message.delta` events arrive,
+    and `on_status(status)` whenever the run's status changes.
+
+    Returns `(run, text)`: the most recent run object seen (its `status` tells
+    the caller whether it still needs to poll - e.g. if the stream dropped
+    before the run finished) and the assistant's answer text.
+    """
+    state = RunStreamState()
+    status = None
+
+    def handle(event, data):
+        nonlocal status
+        if state.handle(event, data) and on_delta:
+            on_delta(state.text)
+        if on_status and state.run.get("status") != status:
+            status = state.run.get("status")
+            on_status(status)
+
+    lines = []
+    try:
+        async for line in resp.aiter_lines():
+            lines.append(line)
+            if line != "":
+                continue
+            for event, data in iter_sse_events(lines):
+                handle(event, data)
+            lines = []
+            if state.done:
+                break
+        if lines and not state.done:
+            for event, data in iter_sse_events(lines):
+                handle(event, data)
+    except httpx.TransportError:
+        # Stream dropped mid-run; the caller falls back to polling if we know the run
+        if not state.run.get("id"):
+            raise
+
+    return state.run, state.answer
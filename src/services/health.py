@@ -0,0 +1,120 @@
+import os
+import time
+import asyncio
+import threading
+from datetime import datetime
+import httpx
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Health probe: a GET that creates nothing server-side. The result is reused
+# for TTL seconds and refreshed in the background every INTERVAL seconds.
+FABRIC_HEALTH_PROBE_PATH = os.getenv("FABRIC_HEALTH_PROBE_PATH", "/assistants")
+FABRIC_HEALTH_TTL = int(os.getenv("FABRIC_HEALTH_TTL", "60"))
+FABRIC_HEALTH_INTERVAL = int(os.getenv("FABRIC_HEALTH_INTERVAL", "30"))
+
+
+def classify_probe_response(resp):
+    """Map a probe response to a `(status, message)` pair."""
+    text = resp.text or ""
+    if "CapacityNotActive" in text:
+        return "capacity_paused", "Fabric capacity is paused"
+    if resp.status_code < 400 or resp.status_code == 405:
+        # 405: the agent endpoint answered, it just doesn't list via GET
+        return "connected", "Connected to Fabric Data Agent"
+    if resp.status_code in (401, 403):
+        return "auth_error", f"Not authorized (HTTP {resp.status_code})"
+    if resp.status_code == 404:
+        return "not_found", "Data Agent not found"
+    return "error", f"HTTP {resp.status_code}"
+
+
+class FabricHealthMonitor:
+    """Process-wide, cached Data Agent health status.
+
+    A background task on the engine's loop probes the agent every `interval`
+    seconds. `status()` returns the cached result without touching the
+    network (except to wait briefly for the very first probe).
+    """
+
+    def __init__(self, engine, path=FABRIC_HEALTH_PROBE_PATH, ttl=FABRIC_HEALTH_TTL,
+                 interval=FABRIC_HEALTH_INTERVAL):
+        self.engine = engine
+        self.path = path
+        self.ttl = ttl
+        self.interval = interval
+
+        self._result = None
+        self._result_time = None
+        self._ready = threading.Event()
+        self._loop_future = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start the background refresh loop (idempotent)."""
+        with self._lock:
+            if self._loop_future is None or self._loop_future.done():
+                self._loop_future = self.engine.submit(self._run())
+
+    def status(self, wait=3):
+        """Latest `{"status", "message", "checked_at", "latency"}`.
+
+        With no result yet, waits up to `wait` seconds for the first probe.
+        A result older than the TTL means the refresh loop stopped, so it is
+        restarted and the result reported as still being checked.
+        """
+        self._ready.wait(wait)
+        with self._lock:
+            result = self._result
+            fresh = result is not None and time.monotonic() - self._result_time < self.ttl
+        if fresh:
+            return result
+        self.start()
+        return {"status": "checking", "message": "Checking connection...", "checked_at": None, "latency": None}
+
+    async def _run(self):
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                print(f"Fabric health probe failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def refresh(self):
+        """Probe the agent now and cache the result."""
+        started = time.monotonic()
+        try:
+            resp = await self.engine.probe(self.path)
+            status, message = classify_probe_response(resp)
+        except httpx.TimeoutException:
+            status, message = "timeout", "Connection timed out"
+        except Exception as e:
+            status, message = "error", str(e)
+
+        result = {
+            "status": status,
+            "message": message,
+            "checked_at": datetime.now().isoformat(),
+            "latency": time.monotonic() - started,
+        }
+        with self._lock:
+            self._result = result
+            self._result_time = time.monotonic()
+        self._ready.set()
+        return result
+
+
+_monitors = {}
+_monitors_lock = threading.Lock()
+
+
+def get_health_monitor(engine) -> FabricHealthMonitor:
+    """Return the process-wide health monitor for `engine`, starting it on first use."""
+    with _monitors_lock:
+        monitor = _monitors.get(engine.base_url)
+        if monitor is None:
+            monitor = FabricHealthMonitor(engine)
+            _monitors[engine.base_url] = monitor
+            monitor.start()
+        return monitor
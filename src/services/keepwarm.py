@@ -0,0 +1,254 @@
+import os
+import time
+import asyncio
+import argparse
+import statistics
+import threading
+from collections import deque
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Keep-warm: while the app is idle, ping the data agent every INTERVAL seconds
+# during the business-hours window (HOURS on DAYS, in TIMEZONE) so the first
+# question after a quiet spell doesn't hit a cold capacity/agent.
+# MODE "probe" sends a GET that creates nothing; "question" asks QUESTION
+# (a full NL-to-SQL run, so it also warms the agent's backend).
+FABRIC_KEEPWARM_ENABLED = os.getenv("FABRIC_KEEPWARM_ENABLED", "false").lower() in ("1", "true", "yes")
+FABRIC_KEEPWARM_INTERVAL = int(os.getenv("FABRIC_KEEPWARM_INTERVAL", "600"))
+FABRIC_KEEPWARM_HOURS = os.getenv("FABRIC_KEEPWARM_HOURS", "08:00-18:00")
+FABRIC_KEEPWARM_DAYS = os.getenv("FABRIC_KEEPWARM_DAYS", "mon-fri")
+FABRIC_KEEPWARM_TIMEZONE = os.getenv("FABRIC_KEEPWARM_TIMEZONE", "")
+FABRIC_KEEPWARM_MODE = os.getenv("FABRIC_KEEPWARM_MODE", "probe")
+FABRIC_KEEPWARM_PATH = os.getenv("FABRIC_KEEPWARM_PATH", "/assistants")
+FABRIC_KEEPWARM_QUESTION = os.getenv("FABRIC_KEEPWARM_QUESTION", "How many patients are there?")
+# A request after this many idle seconds counts as "cold" in the latency stats
+FABRIC_KEEPWARM_COLD_AFTER = int(os.getenv("FABRIC_KEEPWARM_COLD_AFTER", "900"))
+
+DAY_NAMES = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+
+
+def parse_days(spec):
+    """Parse "mon-fri", "mon,wed,fri" or "sat-sun" into a set of weekday numbers."""
+    days = set()
+    for part in spec.lower().replace(" ", "").split(","):
+        if not part:
+            continue
+        if "-" in part:
+            start, end = (DAY_NAMES.index(d[:3]) for d in part.split("-", 1))
+            day = start
+            days.add(day)
+            while day != end:
+                day = (day + 1) % 7
+                days.add(day)
+        else:
+            days.add(DAY_NAMES.index(part[:3]))
+    return days
+
+
+def parse_hours(spec):
+    """Parse "08:00-18:00" into a pair of `datetime.time`."""
+    start, end = spec.split("-", 1)
+    return (datetime.strptime(start.strip(), "%H:%M").time(),
+            datetime.strptime(end.strip(), "%H:%M").time())
+
+
+class BusinessHours:
+    """A weekly time window, e.g. 08:00-18:00 Monday to Friday.
+
+    A window that ends before it starts (e.g. 22:00-06:00) runs overnight;
+    the hours after midnight belong to the previous day's window.
+    """
+
+    def __init__(self, hours=FABRIC_KEEPWARM_HOURS, days=FABRIC_KEEPWARM_DAYS, timezone=FABRIC_KEEPWARM_TIMEZONE):
+        self.start, self.end = parse_hours(hours)
+        self.days = parse_days(days)
+        self.tz = ZoneInfo(timezone) if timezone else None
+
+    def now(self):
+        return datetime.now(self.tz)
+
+    def contains(self, moment=None):
+        moment = moment or self.now()
+        now = moment.time()
+        if self.start <= self.end:
+            return moment.weekday() in self.days and self.start <= now < self.end
+        if now >= self.start:
+            return moment.weekday() in self.days
+        return now < self.end and (moment.weekday() - 1) % 7 in self.days
+
+    def seconds_until_open(self, moment=None):
+        """Seconds until the window next opens (0 if it is open now)."""
+        moment = moment or self.now()
+        if self.contains(moment):
+            return 0
+        for offset in range(8):
+            day = moment.date() + timedelta(days=offset)
+            opens = datetime.combine(day, self.start, tzinfo=moment.tzinfo)
+            if opens > moment and opens.weekday() in self.days:
+                return (opens - moment).total_seconds()
+        return 24 * 3600
+
+
+class WarmthTracker:
+    """Tracks when the agent was last used and cold vs. warm request latency.
+
+    A request is "cold" if the agent had been idle for at least `cold_after`
+    seconds before it started.
+    """
+
+    def __init__(self, cold_after=FABRIC_KEEPWARM_COLD_AFTER, history_size=200):
+        self.cold_after = cold_after
+        self.last_activity = None
+        self._samples = {}
+        self._history_size = history_size
+        self._lock = threading.Lock()
+
+    def idle_for(self):
+        """Seconds since the agent was last used (None if never)."""
+        last = self.last_activity
+        return None if last is None else time.monotonic() - last
+
+    def touch(self):
+        self.last_activity = time.monotonic()
+
+    def record(self, source, latency, idle):
+        """Record one request from `source` ("question" or "keepwarm") and mark activity."""
+        warmth = "cold" if idle is None or idle >= self.cold_after else "warm"
+        with self._lock:
+            samples = self._samples.setdefault((source, warmth), deque(maxlen=self._history_size))
+            samples.append(latency)
+        self.touch()
+
+    def summary(self, source="question"):
+        """`{"cold": {...}, "warm": {...}}` with count, median and max latency (seconds)."""
+        result = {}
+        with self._lock:
+            for warmth in ("cold", "warm"):
+                samples = list(self._samples.get((source, warmth), ()))
+                result[warmth] = {
+                    "count": len(samples),
+                    "median": statistics.median(samples) if samples else None,
+                    "max": max(samples) if samples else None,
+                }
+        return result
+
+
+class KeepWarmScheduler:
+    """Background loop on the engine's event loop that keeps the agent warm.
+
+    Pings only inside the business-hours window and only when no question
+    has used the agent for a full interval, so busy periods cost nothing.
+    """
+
+    def __init__(self, engine, interval=FABRIC_KEEPWARM_INTERVAL, window=None, mode=FABRIC_KEEPWARM_MODE,
+                 path=FABRIC_KEEPWARM_PATH, question=FABRIC_KEEPWARM_QUESTION):
+        self.engine = engine
+        self.interval = interval
+        self.window = window or BusinessHours()
+        self.mode = mode
+        self.path = path
+        self.question = question
+
+        self.pings = 0
+        self.last_ping = None
+        self.last_result = None
+        self._future = None
+
+    def start(self):
+        if self._future is None or self._future.done():
+            self._future = self.engine.submit(self._run())
+
+    def stop(self):
+        if self._future is not None:
+            self._future.cancel()
+
+    async def _run(self):
+        while True:
+            wait = self.window.seconds_until_open()
+            if wait > 0:
+                await asyncio.sleep(wait)
+                continue
+            idle = self.engine.warmth.idle_for()
+            if idle is None or idle >= self.interval:
+                try:
+                    await self.ping()
+                except Exception as e:
+                    print(f"Keep-warm ping failed: {e}")
+                await asyncio.sleep(self.interval)
+            else:
+                # Recently used - check again one interval after that use
+                await asyncio.sleep(self.interval - idle)
+
+    async def ping(self):
+        """Send one keep-warm request; returns its latency in seconds."""
+        idle = self.engine.warmth.idle_for()
+        started = time.monotonic()
+        if self.mode == "question":
+            # ask() records its own latency under the given source
+            answer, thread_id = await self.engine.ask(self.question, max_retries=1, source="keepwarm")
+            await self.engine.end_conversation(thread_id)
+            self.last_result = "ok" if answer else "empty"
+            latency = time.monotonic() - started
+        else:
+            resp = await self.engine.probe(self.path)
+            self.last_result = f"HTTP {resp.status_code}"
+            latency = time.monotonic() - started
+            self.engine.warmth.record("keepwarm", latency, idle)
+        self.pings += 1
+        self.last_ping = datetime.now().isoformat()
+        return latency
+
+
+_schedulers = {}
+_schedulers_lock = threading.Lock()
+
+
+def start_keep_warm(engine) -> KeepWarmScheduler:
+    """Start (once per process and agent) the keep-warm loop for `engine`."""
+    with _schedulers_lock:
+        scheduler = _schedulers.get(engine.base_url)
+        if scheduler is None:
+            scheduler = KeepWarmScheduler(engine)
+            _schedulers[engine.base_url] = scheduler
+            scheduler.start()
+        return scheduler
+
+
+def main():
+    """Ping an agent endpoint a few times and print cold vs. warm latency.
+
+    Useful against a local stand-in, e.g.
+    `python -m services.keepwarm --base-url http://localhost:8765/v1/openai --count 5 --idle 2`
+    """
+    from services.fabric_client import FabricAgentEngine, StaticTokenProvider
+
+    parser = argparse.ArgumentParser(description="Keep-warm ping against a Data Agent endpoint")
+    parser.add_argument("--base-url", required=True, help="Agent OpenAI endpoint (…/aiassistant/openai or a local stand-in)")
+    parser.add_argument("--token", default="local", help="Bearer token to send (a local stand-in ignores it)")
+    parser.add_argument("--mode", choices=("probe", "question"), default=FABRIC_KEEPWARM_MODE)
+    parser.add_argument("--count", type=int, default=3, help="Number of pings")
+    parser.add_argument("--idle", type=float, default=0, help="Seconds to wait between pings")
+    parser.add_argument("--cold-after", type=float, default=FABRIC_KEEPWARM_COLD_AFTER)
+    args = parser.parse_args()
+
+    engine = FabricAgentEngine(args.base_url, StaticTokenProvider(args.token))
+    engine.warmth.cold_after = args.cold_after
+    scheduler = KeepWarmScheduler(engine, mode=args.mode)
+    try:
+        for i in range(args.count):
+            if i and args.idle:
+                time.sleep(args.idle)
+            latency = engine.submit(scheduler.ping()).result()
+            print(f"ping {i + 1}: {latency * 1000:.0f} ms ({scheduler.last_result})")
+        for warmth, stats in engine.warmth.summary("keepwarm").items():
+            if stats["count"]:
+                print(f"{warmth}: {stats['count']} ping(s), median {stats['median'] * 1000:.0f} ms")
+    finally:
+        engine.close()
+
+
+if __name__ == "__main__":
+    main()
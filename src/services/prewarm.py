@@ -0,0 +1,113 @@
+import os
+import asyncio
+import threading
+from datetime import datetime
+from dotenv import load_dotenv
+from services.answer_cache import answer_cache
+from services.circuit_breaker import CircuitOpenError
+from services.fabric_engine import CapacityNotActiveError
+
+load_dotenv()
+
+# Pre-warm the Quick Actions answers at startup and then every INTERVAL seconds,
+# running at most CONCURRENCY questions at a time. Off by default: every refresh
+# is a full NL-to-SQL run per Quick Action and uses capacity units around the
+# clock. Keep FABRIC_ANSWER_CACHE_TTL above the interval so warmed answers don't
+# expire between refreshes.
+FABRIC_PREWARM_ENABLED = os.getenv("FABRIC_PREWARM_ENABLED", "false").lower() in ("1", "true", "yes")
+FABRIC_PREWARM_INTERVAL = int(os.getenv("FABRIC_PREWARM_INTERVAL", "1800"))
+FABRIC_PREWARM_CONCURRENCY = int(os.getenv("FABRIC_PREWARM_CONCURRENCY", "2"))
+
+
+class QuickActionPrewarmer:
+    """Background refresher that keeps the Quick Actions answers in the answer cache.
+
+    Runs on the engine's event loop. A refresh stops early (and the next one
+    is skipped until the interval passes again) when the capacity reports
+    CapacityNotActive or the circuit breaker is open, so an unavailable
+    capacity costs at most one request per interval.
+
+    Questions are asked under their answer cache key, so a user clicking a
+    Quick Action while it is being warmed joins that run instead of starting
+    another.
+    """
+
+    def __init__(self, engine, questions, workspace_id, artifact_id, cache=answer_cache,
+                 interval=FABRIC_PREWARM_INTERVAL, concurrency=FABRIC_PREWARM_CONCURRENCY):
+        self.engine = engine
+        self.questions = list(questions)
+        self.workspace_id = workspace_id
+        self.artifact_id = artifact_id
+        self.cache = cache
+        self.interval = interval
+        self.concurrency = concurrency
+
+        self.capacity_paused = False
+        self.last_refresh = None
+        self.last_results = {}
+        self._future = None
+
+    def start(self):
+        if self._future is None or self._future.done():
+            self._future = self.engine.submit(self._run())
+
+    def stop(self):
+        if self._future is not None:
+            self._future.cancel()
+
+    async def _run(self):
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                print(f"Quick Actions pre-warm failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def refresh(self):
+        """Ask every quick question once and store the answers."""
+        semaphore = asyncio.Semaphore(self.concurrency)
+        paused = asyncio.Event()
+
+        async def warm(question):
+            async with semaphore:
+                if paused.is_set():
+                    return "skipped"
+                key = self.cache.make_key(self.workspace_id, self.artifact_id, question)
+                try:
+                    answer, thread_id = await self.engine.ask_shared(key, question, source="prewarm")
+                except (CapacityNotActiveError, CircuitOpenError):
+                    paused.set()
+                    return "capacity_paused"
+                except Exception as e:
+                    return f"error: {e}"
+                # Warming questions are one-offs - release their threads right away
+                # (there is none if this joined a user's run)
+                if thread_id:
+                    await self.engine.end_conversation(thread_id)
+                if not answer:
+                    return "empty"
+                self.cache.put(key, answer)
+                return "ok"
+
+        results = await asyncio.gather(*(warm(q) for q in self.questions))
+        self.capacity_paused = paused.is_set()
+        self.last_refresh = datetime.now().isoformat()
+        self.last_results = dict(zip(self.questions, results))
+        if self.capacity_paused:
+            print("Quick Actions pre-warm skipped: Fabric capacity is paused")
+
+
+_prewarmers = {}
+_prewarmers_lock = threading.Lock()
+
+
+def start_quick_action_prewarm(engine, questions, workspace_id, artifact_id) -> QuickActionPrewarmer:
+    """Start (once per process and agent) the Quick Actions pre-warm loop."""
+    key = (workspace_id, artifact_id)
+    with _prewarmers_lock:
+        prewarmer = _prewarmers.get(key)
+        if prewarmer is None:
+            prewarmer = QuickActionPrewarmer(engine, questions, workspace_id, artifact_id)
+            _prewarmers[key] = prewarmer
+            prewarmer.start()
+        return prewarmer
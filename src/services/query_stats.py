@@ -0,0 +1,70 @@
+import os
+import math
+import threading
+from collections import deque
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Most recent queries kept for the process-wide latency analytics
+FABRIC_QUERY_LOG_SIZE = int(os.getenv("FABRIC_QUERY_LOG_SIZE", "1000"))
+
+
+def percentile(values, pct):
+    """`pct`th percentile (0-100) of `values` by linear interpolation, or None if empty."""
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    rank = (len(ordered) - 1) * pct / 100
+    low = math.floor(rank)
+    high = math.ceil(rank)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def latency_summary(records):
+    """Count, p50/p95/p99 latency, cache-hit rate and retries for query records."""
+    latencies = [r["latency"] for r in records if r.get("latency") is not None]
+    return {
+        "count": len(records),
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+        "cache_hit_rate": sum(1 for r in records if r.get("cached")) / len(records) if records else None,
+        "retries": sum(max(r.get("attempts", 1) - 1, 0) for r in records),
+        "errors": sum(1 for r in records if r.get("outcome") not in ("ok", "cached")),
+    }
+
+
+class QueryLog:
+    """Process-wide, bounded log of query records for latency analytics.
+
+    A record is a dict with `timestamp`, `session_id`, `query`, `latency`
+    (seconds, end to end), `phases` (seconds per ask-flow phase), `attempts`,
+    `cached`, `shared` and `outcome`.
+    """
+
+    def __init__(self, max_size=FABRIC_QUERY_LOG_SIZE):
+        self._records = deque(maxlen=max_size)
+        self._lock = threading.Lock()
+
+    def add(self, record):
+        with self._lock:
+            self._records.append(record)
+
+    def records(self, session_id=None):
+        with self._lock:
+            records = list(self._records)
+        if session_id is not None:
+            records = [r for r in records if r.get("session_id") == session_id]
+        return records
+
+    def clear(self):
+        with self._lock:
+            self._records.clear()
+
+    def __len__(self):
+        return len(self._records)
+
+
+# Shared by all sessions in the process
+query_log = QueryLog()
@@ -0,0 +1,53 @@
+import asyncio
+
+
+class SingleFlight:
+    """Coalesces identical in-flight calls into one.
+
+    The first caller for a key starts the work as a task; callers that arrive
+    with the same key while it is running wait on that task and get the same
+    result or exception. Streamed text is fanned out to every waiting caller,
+    and late joiners immediately see the text produced so far.
+
+    All methods must be called on the same event loop.
+    """
+
+    def __init__(self):
+        self._flights = {}
+
+    def __len__(self):
+        return len(self._flights)
+
+    def in_flight(self, key):
+        return key in self._flights
+
+    async def run(self, key, fn, on_delta=None):
+        """Run `fn(on_delta)` once per key at a time.
+
+        Returns `(result, shared)`; `shared` is True if this caller joined a
+        call another caller started.
+        """
+        flight = self._flights.get(key)
+        shared = flight is not None
+        if flight is None:
+            flight = {"subscribers": [], "text": None}
+
+            def fan_out(text):
+                flight["text"] = text
+                for callback in list(flight["subscribers"]):
+                    callback(text)
+
+            flight["task"] = asyncio.ensure_future(fn(fan_out))
+            flight["task"].add_done_callback(lambda _: self._flights.pop(key, None))
+            self._flights[key] = flight
+
+        if on_delta is not None:
+            if flight["text"]:
+                on_delta(flight["text"])
+            flight["subscribers"].append(on_delta)
+        try:
+            # Shielded so one caller giving up doesn't cancel the others
+            return await asyncio.shield(flight["task"]), shared
+        finally:
+            if on_delta is not None and on_delta in flight["subscribers"]:
+                flight["subscribers"].remove(on_delta)
@@ -0,0 +1,301 @@
+import os
+import time
+import bisect
+import threading
+import contextvars
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from dotenv import load_dotenv
+
+load_dotenv()
+
+try:
+    from opentelemetry import trace as otel_trace
+except ImportError:  # OpenTelemetry is optional
+    otel_trace = None
+
+# Serve Prometheus metrics on this port at /metrics (0 disables)
+FABRIC_METRICS_PORT = int(os.getenv("FABRIC_METRICS_PORT", "0"))
+# Export spans over OTLP (needs opentelemetry-sdk and opentelemetry-exporter-otlp;
+# configure the collector with the standard OTEL_EXPORTER_OTLP_* variables)
+FABRIC_OTEL_ENABLED = os.getenv("FABRIC_OTEL_ENABLED", "false").lower() in ("1", "true", "yes")
+
+# Histogram buckets (seconds): phases range from ~50 ms HTTP calls to multi-minute runs
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+
+# Attempt number of the ask() retry loop the current coroutine is in
+current_attempt = contextvars.ContextVar("fabric_attempt", default=1)
+_current_span = contextvars.ContextVar("fabric_span", default=None)
+# Per-question phase totals being collected (see collect_phases)
+_phase_totals = contextvars.ContextVar("fabric_phase_totals", default=None)
+
+
+class Histogram:
+    """Prometheus-style cumulative histogram with labels."""
+
+    def __init__(self, name, help_text, labels, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(label, "")) for label in self.labels)
+        with self._lock:
+            series = self._series.setdefault(key, {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0})
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                series["counts"][index] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                base = _format_labels(self.labels, key)
+                cumulative = 0
+                for bound, count in zip(self.buckets, series["counts"]):
+                    cumulative += count
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labels + ('le',), key + (_format_number(bound),))} {cumulative}")
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels + ('le',), key + ('+Inf',))} {series['count']}")
+                lines.append(f"{self.name}_sum{base} {series['sum']}")
+                lines.append(f"{self.name}_count{base} {series['count']}")
+        return lines
+
+
+class Counter:
+    """Prometheus-style counter with labels."""
+
+    def __init__(self, name, help_text, labels):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(label, "")) for label in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labels, key)} {value}")
+        return lines
+
+
+def _format_number(value):
+    return str(int(value)) if float(value).is_integer() else str(value)
+
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        escaped = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{name}="{escaped}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+PHASE_DURATION = Histogram(
+    "fabric_agent_phase_duration_seconds",
+    "Duration of each step of the Data Agent ask flow (phase=\"ask\" is end to end, including retries).",
+    ("phase", "outcome"),
+)
+HTTP_REQUESTS = Counter(
+    "fabric_agent_http_requests_total",
+    "HTTP requests to the Data Agent API by step and status code.",
+    ("phase", "status"),
+)
+HTTP_BYTES = Counter(
+    "fabric_agent_http_bytes_total",
+    "Bytes sent to and received from the Data Agent API by step.",
+    ("phase", "direction"),
+)
+METRICS = (PHASE_DURATION, HTTP_REQUESTS, HTTP_BYTES)
+
+
+def render_metrics():
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+class SpanRecord:
+    """Timing and attributes of one phase; `attributes` end up on the OTel span."""
+
+    def __init__(self, name):
+        self.name = name
+        self.attributes = {}
+        self.duration = None
+
+    def set(self, key, value):
+        self.attributes[key] = value
+
+
+_tracer = None
+_tracer_lock = threading.Lock()
+
+
+def get_tracer():
+    """OpenTelemetry tracer (None if opentelemetry-api isn't installed)."""
+    global _tracer
+    if otel_trace is None:
+        return None
+    with _tracer_lock:
+        if _tracer is None:
+            if FABRIC_OTEL_ENABLED:
+                _configure_otlp_export()
+            _tracer = otel_trace.get_tracer("healthcare-agent.fabric")
+        return _tracer
+
+
+def _configure_otlp_export():
+    try:
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+    except ImportError as e:
+        print(f"OpenTelemetry export disabled: {e}")
+        return
+    if isinstance(otel_trace.get_tracer_provider(), TracerProvider):
+        return  # Already set up by the app or opentelemetry-instrument
+    provider = TracerProvider(resource=Resource.create({"service.name": os.getenv("OTEL_SERVICE_NAME", "healthcare-agent")}))
+    provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+    otel_trace.set_tracer_provider(provider)
+
+
+@contextmanager
+def collect_phases(totals):
+    """Add the duration of every phase inside the block to `totals[phase]` (seconds)."""
+    token = _phase_totals.set(totals)
+    try:
+        yield totals
+    finally:
+        _phase_totals.reset(token)
+
+
+def _add_to_totals(phase, duration):
+    totals = _phase_totals.get()
+    if totals is not None:
+        totals[phase] = totals.get(phase, 0) + duration
+
+
+@contextmanager
+def span(phase, **attributes):
+    """Time one phase of the ask flow.
+
+    Records the duration in the phase histogram (labelled with the outcome:
+    "ok" or the exception type) and, if OpenTelemetry is installed, as a
+    `fabric.<phase>` span carrying the attempt number and any attributes
+    set on the yielded `SpanRecord` (HTTP status, byte counts, ...).
+    """
+    record = SpanRecord(phase)
+    record.attributes.update({"fabric.attempt": current_attempt.get(), **attributes})
+    tracer = get_tracer()
+    otel_span = None
+    otel_cm = None
+    if tracer is not None:
+        otel_cm = tracer.start_as_current_span(f"fabric.{phase}")
+        otel_span = otel_cm.__enter__()
+    token = _current_span.set(record)
+    started = time.perf_counter()
+    outcome = "ok"
+    try:
+        yield record
+    except BaseException as e:
+        outcome = type(e).__name__
+        if otel_span is not None:
+            otel_span.record_exception(e)
+            otel_span.set_status(otel_trace.Status(otel_trace.StatusCode.ERROR, str(e)[:200]))
+        raise
+    finally:
+        record.duration = time.perf_counter() - started
+        _current_span.reset(token)
+        PHASE_DURATION.observe(record.duration, phase=phase, outcome=outcome)
+        _add_to_totals(phase, record.duration)
+        if otel_span is not None:
+            for key, value in record.attributes.items():
+                if value is not None:
+                    otel_span.set_attribute(key, value)
+            otel_cm.__exit__(None, None, None)
+
+
+def record_phase(phase, duration, outcome="ok", **attributes):
+    """Record a phase measured after the fact (e.g. how long a run sat queued)."""
+    PHASE_DURATION.observe(duration, phase=phase, outcome=outcome)
+    _add_to_totals(phase, duration)
+    tracer = get_tracer()
+    if tracer is not None:
+        end = time.time_ns()
+        otel_span = tracer.start_span(f"fabric.{phase}", start_time=end - int(duration * 1e9))
+        otel_span.set_attribute("fabric.attempt", current_attempt.get())
+        for key, value in attributes.items():
+            if value is not None:
+                otel_span.set_attribute(key, value)
+        otel_span.end(end_time=end)
+
+
+def record_response(resp):
+    """Attach an HTTP response's status and byte counts to the current phase."""
+    record = _current_span.get()
+    phase = record.name if record is not None else "other"
+    try:
+        request_bytes = len(resp.request.content)
+    except Exception:
+        request_bytes = 0
+    try:
+        response_bytes = len(resp.content)
+    except Exception:
+        response_bytes = resp.num_bytes_downloaded  # Streamed body
+    HTTP_REQUESTS.inc(phase=phase, status=resp.status_code)
+    HTTP_BYTES.inc(request_bytes, phase=phase, direction="sent")
+    HTTP_BYTES.inc(response_bytes, phase=phase, direction="received")
+    if record is not None:
+        record.set("http.status_code", resp.status_code)
+        record.set("http.request.body.size", record.attributes.get("http.request.body.size", 0) + request_bytes)
+        record.set("http.response.body.size", record.attributes.get("http.response.body.size", 0) + response_bytes)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render_metrics().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Keep scrapes out of the app log
+
+
+_metrics_server = None
+_metrics_server_lock = threading.Lock()
+
+
+def start_metrics_server(port=FABRIC_METRICS_PORT, host="0.0.0.0"):
+    """Serve /metrics on `port` from a daemon thread (once per process)."""
+    global _metrics_server
+    with _metrics_server_lock:
+        if _metrics_server is not None or not port:
+            return _metrics_server
+        try:
+            _metrics_server = ThreadingHTTPServer((host, port), _MetricsHandler)
+        except OSError as e:
+            print(f"Metrics endpoint not started on port {port}: {e}")
+            return None
+        threading.Thread(target=_metrics_server.serve_forever, name="fabric-metrics", daemon=True).start()
+        return _metrics_server
@@ -0,0 +1,372 @@
+"""
+Benchmark suite for the client hot paths, with stored baselines.
+
+Benchmarks:
+  ask_flow_*                  Full ask flow (FabricAgentEngine) against the local
+                              simulator with zero server latency, so only client
+                              overhead and local HTTP round trips are measured
+  format_response_with_sql_*  SQL detection/formatting of large answers
+  process_uploaded_file_*     Loading large CSV / Excel uploads
+  chat_export_*               Markdown export of long chat histories
+
+Usage:
+    python tests/benchmarks.py run                       # print results
+    python tests/benchmarks.py run --output current.json
+    python tests/benchmarks.py run --save-baseline       # overwrite tests/benchmark_baseline.json
+    python tests/benchmarks.py compare current.json      # exit code 1 on regression
+    python tests/benchmarks.py run --compare             # run, then compare to the baseline
+
+Each benchmark runs `--repeat` rounds of a fixed number of iterations and
+reports the median and minimum time per iteration. Fast benchmarks use enough
+iterations for a round to take tens of milliseconds. `compare` flags a
+benchmark as regressed when its best round (the minimum, which is the least
+affected by scheduling noise) is more than its threshold slower than the
+baseline's, after scaling for how fast the machine ran a fixed reference
+workload around each benchmark compared with when the baseline was
+recorded. The threshold is `--threshold` (default 25%) unless the
+benchmark sets its own, as the ask-flow and sub-millisecond ones do.
+`run --compare` re-runs a regressed benchmark once and keeps its better
+result before failing. Timings depend on the machine, so compare against a
+baseline recorded on the same kind of machine (e.g. the CI runner).
+"""
+
+import io
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import statistics
+from pathlib import Path
+from datetime import datetime
+
+# Add src to path to allow imports
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+import pandas as pd
+from fabric_simulator import FabricSimulator, SimulatorConfig
+from services.chat_formatting import build_chat_export, format_response_with_sql, process_uploaded_file
+from services.fabric_client import FabricAgentEngine, StaticTokenProvider
+
+BASELINE_PATH = Path(__file__).parent / "benchmark_baseline.json"
+DEFAULT_THRESHOLD = 0.25
+# Only flag these once they are twice as slow: sub-millisecond benchmarks move
+# with memory layout and hash seeds from one process to the next, and the ask
+# flow shares the CPU with the in-process simulator
+NOISY_THRESHOLD = 1.0
+
+
+class Benchmark:
+    """One benchmark: `setup()` returns state passed to each `run(state)` call; `teardown(state)` cleans up.
+
+    `threshold` overrides the allowed slowdown used by `compare`.
+    """
+
+    def __init__(self, name, run, setup=None, teardown=None, iterations=10, description="", threshold=None):
+        self.name = name
+        self.run = run
+        self.setup = setup or (lambda: None)
+        self.teardown = teardown or (lambda state: None)
+        self.iterations = iterations
+        self.description = description
+        self.threshold = threshold
+
+
+# ============================================================================
+# Fixtures
+# ============================================================================
+
+def markdown_table(rows, columns=6):
+    header = "| " + " | ".join(f"Column {c}" for c in range(columns)) + " |"
+    divider = "|" + "---|" * columns
+    body = [
+        "| " + " | ".join(f"value {r}-{c}" if c % 2 else str(r * 37 + c) for c in range(columns)) + " |"
+        for r in range(rows)
+    ]
+    return "\n".join([header, divider] + body)
+
+
+def large_answer(rows, fenced=True):
+    """An agent-style answer with a `rows`-row table and the SQL behind it."""
+    sql = ("SELECT description, COUNT(DISTINCT patient) AS patient_count, SUM(totalcost) AS total_cost "
+           "FROM medications GROUP BY description ORDER BY total_cost DESC")
+    sql_part = f"```sql\n{sql}\n```" if fenced else sql
+    return f"Here are the results:\n\n{markdown_table(rows)}\n\nThe query used:\n\n{sql_part}\n\nLet me know if you need more."
+
+
+def upload(name, data):
+    buffer = io.BytesIO(data)
+    buffer.name = name
+    return buffer
+
+
+def csv_upload(rows):
+    rng = random.Random(1)
+    df = pd.DataFrame({
+        "patient": [f"p{i:07d}" for i in range(rows)],
+        "age": [rng.randint(0, 100) for _ in range(rows)],
+        "gender": [rng.choice("MF") for _ in range(rows)],
+        "condition": [rng.choice(["Hypertension", "Diabetes", "Asthma", "Obesity"]) for _ in range(rows)],
+        "cost": [round(rng.uniform(10, 5000), 2) for _ in range(rows)],
+        "visit_date": [f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}" for _ in range(rows)],
+    })
+    return df.to_csv(index=False).encode("utf-8"), df
+
+
+def excel_upload(rows):
+    _, df = csv_upload(rows)
+    buffer = io.BytesIO()
+    df.to_excel(buffer, index=False)
+    return buffer.getvalue()
+
+
+def chat_history(turns):
+    messages = []
+    for i in range(turns):
+        messages.append({"role": "user", "content": f"Question {i}: show the top medications by cost"})
+        messages.append({"role": "assistant", "content": large_answer(20)})
+    return messages
+
+
+# ============================================================================
+# Ask flow against the local simulator
+# ============================================================================
+
+def _simulator_engine(**engine_kwargs):
+    simulator = FabricSimulator(SimulatorConfig(queue_time="const:0", run_time="const:0", http_latency="const:0", seed=1))
+    simulator.start()
+    engine = FabricAgentEngine(simulator.base_url, StaticTokenProvider("benchmark"), **engine_kwargs)
+    engine.ask_sync("warm up")  # Assistant created, connections open
+    return simulator, engine
+
+
+def _close_simulator_engine(state):
+    simulator, engine = state[:2]
+    engine.close()
+    simulator.stop()
+
+
+def ask_new_thread(state):
+    engine = state[1]
+    answer, thread_id = engine.ask_sync("Show the top 10 medications by cost")
+    engine.end_conversation_sync(thread_id)
+
+
+def ask_streamed(state):
+    engine = state[1]
+    answer, thread_id = engine.ask_sync("Show the top 10 medications by cost", on_delta=lambda text: None)
+    engine.end_conversation_sync(thread_id)
+
+
+def setup_long_thread(turns=40):
+    simulator, engine = _simulator_engine(thread_max_turns=10_000)
+    _, thread_id = engine.ask_sync("First question")
+    for i in range(turns - 1):
+        _, thread_id = engine.ask_sync(f"Follow-up {i}", thread_id=thread_id)
+    return simulator, engine, [thread_id]
+
+
+def ask_follow_up(state):
+    engine, thread = state[1], state[2]
+    _, thread[0] = engine.ask_sync("And by gender?", thread_id=thread[0])
+
+
+# ============================================================================
+# Registry
+# ============================================================================
+
+BENCHMARKS = [
+    Benchmark("ask_flow_new_thread", ask_new_thread, _simulator_engine, _close_simulator_engine, iterations=20,
+              description="ask() on a fresh thread, polled run, zero server latency",
+              threshold=NOISY_THRESHOLD),
+    Benchmark("ask_flow_streamed", ask_streamed, _simulator_engine, _close_simulator_engine, iterations=20,
+              description="ask() with a streamed run (SSE), zero server latency",
+              threshold=NOISY_THRESHOLD),
+    Benchmark("ask_flow_follow_up_long_thread", ask_follow_up, setup_long_thread, _close_simulator_engine, iterations=20,
+              description="Follow-up ask() on a thread that already has 40 turns",
+              threshold=NOISY_THRESHOLD),
+    Benchmark("format_response_with_sql_fenced_5k_rows", format_response_with_sql,
+              lambda: large_answer(5000, fenced=True), iterations=500,
+              description="5,000-row table answer whose SQL is already in a ```sql block",
+              threshold=NOISY_THRESHOLD),
+    Benchmark("format_response_with_sql_inline_5k_rows", format_response_with_sql,
+              lambda: large_answer(5000, fenced=False), iterations=20,
+              description="5,000-row table answer with inline SQL to wrap"),
+    Benchmark("process_uploaded_file_csv_100k_rows", lambda data: process_uploaded_file(upload("data.csv", data)),
+              lambda: csv_upload(100_000)[0], iterations=3,
+              description="100,000-row, 6-column CSV upload"),
+    Benchmark("process_uploaded_file_xlsx_10k_rows", lambda data: process_uploaded_file(upload("data.xlsx", data)),
+              lambda: excel_upload(10_000), iterations=2,
+              description="10,000-row, 6-column Excel upload"),
+    Benchmark("chat_export_500_turns", build_chat_export, lambda: chat_history(500), iterations=200,
+              description="Markdown export of 1,000 messages",
+              threshold=NOISY_THRESHOLD),
+]
+
+
+# ============================================================================
+# Running and comparing
+# ============================================================================
+
+def _reference_workload():
+    data = [(i * 7919) % 10007 for i in range(50_000)]
+    return ",".join(str(x) for x in sorted(data))
+
+
+def calibrate(rounds=5):
+    """Best time of a fixed pure-Python workload: how fast the machine is running right now."""
+    times = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        _reference_workload()
+        times.append(time.perf_counter() - started)
+    return min(times)
+
+
+def run_benchmark(benchmark, repeat=5):
+    calibration = calibrate()
+    state = benchmark.setup()
+    try:
+        benchmark.run(state)  # Warm-up
+        rounds = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            for _ in range(benchmark.iterations):
+                benchmark.run(state)
+            rounds.append((time.perf_counter() - started) / benchmark.iterations)
+    finally:
+        benchmark.teardown(state)
+    return {
+        "median": statistics.median(rounds),
+        "min": min(rounds),
+        # Reference workload time around the benchmark, to factor out machine load
+        "calibration": (calibration + calibrate()) / 2,
+        "iterations": benchmark.iterations,
+        "repeat": repeat,
+        "threshold": benchmark.threshold,
+        "description": benchmark.description,
+    }
+
+
+def run_all(names=None, repeat=5):
+    results = {}
+    for benchmark in BENCHMARKS:
+        if names and not any(n in benchmark.name for n in names):
+            continue
+        print(f"  {benchmark.name:<45}", end="", flush=True)
+        results[benchmark.name] = result = run_benchmark(benchmark, repeat)
+        print(f"{_ms(result['median']):>12} median {_ms(result['min']):>12} min")
+    return {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "machine": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "processor": platform.processor() or platform.machine(),
+        },
+        "benchmarks": results,
+    }
+
+
+def compare(current, baseline, threshold=DEFAULT_THRESHOLD):
+    """Print current vs. baseline best rounds; returns the names of regressed benchmarks.
+
+    Current times are scaled by how much slower or faster the machine ran
+    the reference workload than when the baseline was recorded (the
+    "Machine" column), so load on a shared runner isn't reported as a
+    regression. `threshold` applies to benchmarks that don't set their own.
+    """
+    regressions = []
+    print(f"\n{'Benchmark (best round)':<45}{'Baseline':>12}{'Current':>12}{'Machine':>9}{'Change':>9}{'Limit':>7}")
+    for name, result in current["benchmarks"].items():
+        base = baseline["benchmarks"].get(name)
+        if base is None:
+            print(f"{name:<45}{'-':>12}{_ms(result['min']):>12}{'':>9}{'new':>9}")
+            continue
+        limit = result.get("threshold") or threshold
+        machine = result["calibration"] / base["calibration"] if result.get("calibration") and base.get("calibration") else 1
+        change = result["min"] / machine / base["min"] - 1 if base["min"] else 0
+        flag = ""
+        if change > limit:
+            regressions.append(name)
+            flag = "  ❌ REGRESSION"
+        elif change < -limit:
+            flag = "  ✅ faster"
+        print(f"{name:<45}{_ms(base['min']):>12}{_ms(result['min']):>12}{machine - 1:>+9.0%}{change:>+9.0%}{limit:>7.0%}{flag}")
+
+    if baseline.get("machine") != current.get("machine"):
+        print("\n⚠️ Baseline was recorded on a different machine/Python; differences may not be meaningful")
+    if regressions:
+        print(f"\n❌ {len(regressions)} benchmark(s) slower than the baseline by more than their limit")
+    else:
+        print("\n✅ No benchmark slower than the baseline by more than its limit")
+    return regressions
+
+
+def compare_confirmed(results, baseline, threshold=DEFAULT_THRESHOLD, repeat=5):
+    """`compare()`, re-running any regressed benchmark once before reporting it.
+
+    A burst of load on the machine can slow every round of one benchmark;
+    each re-run benchmark keeps the better of its two best rounds.
+    """
+    regressions = compare(results, baseline, threshold)
+    if not regressions:
+        return regressions
+    print(f"\nRe-running {len(regressions)} benchmark(s) to confirm")
+    rerun = run_all(regressions, repeat)["benchmarks"]
+    for name in regressions:
+        if rerun[name]["min"] < results["benchmarks"][name]["min"]:
+            results["benchmarks"][name] = rerun[name]
+    return compare(results, baseline, threshold)
+
+
+def _ms(seconds):
+    return f"{seconds * 1000:.2f} ms"
+
+
+def _load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Client hot-path benchmarks")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = sub.add_parser("run", help="Run the benchmarks")
+    run_parser.add_argument("names", nargs="*", help="Only run benchmarks whose name contains one of these")
+    run_parser.add_argument("--repeat", type=int, default=5, help="Timed rounds per benchmark")
+    run_parser.add_argument("--output", type=str, help="Write results to this JSON file")
+    run_parser.add_argument("--save-baseline", action="store_true", help=f"Write results to {BASELINE_PATH.name}")
+    run_parser.add_argument("--compare", action="store_true", help="Compare results to the baseline afterwards")
+    run_parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="Allowed slowdown for benchmarks without their own (0.25 = 25%%)")
+
+    compare_parser = sub.add_parser("compare", help="Compare a results file to the baseline")
+    compare_parser.add_argument("current", help="Results JSON from `run --output`")
+    compare_parser.add_argument("--baseline", default=str(BASELINE_PATH))
+    compare_parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="Allowed slowdown for benchmarks without their own (0.25 = 25%%)")
+
+    args = parser.parse_args()
+
+    if args.command == "compare":
+        return 1 if compare(_load(args.current), _load(args.baseline), args.threshold) else 0
+
+    print(f"Running benchmarks ({args.repeat} rounds each)")
+    results = run_all(args.names, args.repeat)
+    regressions = []
+    if args.compare:
+        regressions = compare_confirmed(results, _load(BASELINE_PATH), args.threshold, args.repeat)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\n📄 Results saved to: {args.output}")
+    if args.save_baseline:
+        with open(BASELINE_PATH, "w") as f:
+            json.dump(results, f, indent=2)
+            f.write("\n")
+        print(f"\n📄 Baseline saved to: {BASELINE_PATH}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
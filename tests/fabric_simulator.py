@@ -0,0 +1,676 @@
+"""
+Local Fabric Data Agent simulator.
+
+Serves the OpenAI Assistants-style routes the app's ask flow uses
+(/assistants, /threads, /threads/{id}/messages, /threads/{id}/runs,
+/threads/{id}/runs/{id}, DELETE /threads/{id}) from memory, so client
+changes can be exercised and benchmarked without a Fabric capacity.
+
+Runs sit "queued" for a sampled queue time, then "in_progress" for a sampled
+run time, then complete with a canned answer (a markdown table and the SQL
+that "produced" it). Faults can be injected at a configurable rate:
+404 CapacityNotActive, 429 with Retry-After, 5xx, and runs that fail with
+`server_error`. Runs created with `"stream": true` are answered as
+server-sent events.
+
+Usage:
+    python tests/fabric_simulator.py --queue-time lognormal:1,0.5 --run-time lognormal:6,0.4
+    python tests/fabric_simulator.py --rate-429 0.05 --rate-5xx 0.02 --rate-run-failed 0.01
+
+Then point the app or a script at it:
+    cd src && FABRIC_API_BASE=http://127.0.0.1:8765/v1/openai streamlit run Home.py   (still needs an Azure login for the token)
+    cd src && python -m services.keepwarm --base-url http://127.0.0.1:8765/v1/openai --mode question
+
+The bearer token isn't checked. Any path prefix is accepted in front of the
+routes. Extra control routes (not part of the real API):
+    GET  /_sim/stats    request, run and fault counts
+    POST /_sim/config   change settings at runtime, e.g. {"paused": true}
+    POST /_sim/reset    drop all state and counts
+
+From Python (used by the benchmarks and load tests):
+    with FabricSimulator(SimulatorConfig(run_time="const:0.2")) as sim:
+        engine = FabricAgentEngine(sim.base_url, token_provider)
+"""
+
+import re
+import sys
+import json
+import math
+import time
+import uuid
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+DEFAULT_PORT = 8765
+DEFAULT_BASE_PATH = "/v1/openai"
+
+
+# ============================================================================
+# Latency distributions
+# ============================================================================
+
+def parse_distribution(spec):
+    """Parse a latency distribution spec into a sampling function (seconds).
+
+    Specs: "const:S", "uniform:LOW,HIGH", "normal:MEAN,SD", "exp:MEAN",
+    "lognormal:MEDIAN,SIGMA". A bare number is a constant. Samples are
+    never negative.
+    """
+    spec = str(spec).strip()
+    kind, _, args = spec.partition(":")
+    if not args:
+        kind, args = "const", kind
+    try:
+        values = [float(v) for v in args.split(",")]
+        if kind == "const":
+            (value,) = values
+            sample = lambda rng: value
+        elif kind == "uniform":
+            low, high = values
+            sample = lambda rng: rng.uniform(low, high)
+        elif kind == "normal":
+            mean, sd = values
+            sample = lambda rng: rng.gauss(mean, sd)
+        elif kind == "exp":
+            (mean,) = values
+            sample = lambda rng: rng.expovariate(1 / mean) if mean > 0 else 0
+        elif kind == "lognormal":
+            median, sigma = values
+            sample = lambda rng: rng.lognormvariate(math.log(median), sigma) if median > 0 else 0
+        else:
+            raise ValueError(f"unknown distribution '{kind}'")
+    except ValueError as e:
+        raise ValueError(f"Bad latency distribution '{spec}': {e}") from None
+    return lambda rng: max(sample(rng), 0.0)
+
+
+def _rate(value):
+    if isinstance(value, bool):
+        raise ValueError("expected a number from 0 to 1")
+    rate = float(value)
+    if not 0 <= rate <= 1:
+        raise ValueError("expected a number from 0 to 1")
+    return rate
+
+
+def _count(value):
+    if isinstance(value, bool) or (isinstance(value, float) and not value.is_integer()):
+        raise ValueError("expected a whole number")
+    count = int(value)
+    if count < 0:
+        raise ValueError("expected a whole number of at least 0")
+    return count
+
+
+def _flag(value):
+    if isinstance(value, bool):
+        return value
+    if str(value).strip().lower() in ("1", "true", "yes"):
+        return True
+    if str(value).strip().lower() in ("0", "false", "no"):
+        return False
+    raise ValueError("expected true or false")
+
+
+class SimulatorConfig:
+    """Latency model and fault rates of a simulator (all rates are 0-1)."""
+
+    FIELDS = ("queue_time", "run_time", "http_latency", "answer_rows", "stream_chunks",
+              "paused", "rate_capacity", "rate_429", "rate_5xx", "rate_run_failed", "retry_after")
+
+    def __init__(self, queue_time="lognormal:1,0.5", run_time="lognormal:6,0.4", http_latency="uniform:0.02,0.08",
+                 answer_rows=10, stream_chunks=20, paused=False, rate_capacity=0.0, rate_429=0.0,
+                 rate_5xx=0.0, rate_run_failed=0.0, retry_after=1, seed=None):
+        self.queue_time = queue_time
+        self.run_time = run_time
+        self.http_latency = http_latency
+        self.answer_rows = answer_rows
+        self.stream_chunks = stream_chunks
+        self.paused = paused                    # Every request gets 404 CapacityNotActive
+        self.rate_capacity = rate_capacity      # Random 404 CapacityNotActive
+        self.rate_429 = rate_429
+        self.rate_5xx = rate_5xx
+        self.rate_run_failed = rate_run_failed  # Run ends "failed" with a server_error
+        self.retry_after = retry_after          # Retry-After seconds sent with 429s
+        self.rng = random.Random(seed)
+        self.update(self.to_dict())
+
+    DISTRIBUTIONS = ("queue_time", "run_time", "http_latency")
+    # How each other setting is checked and converted
+    CONVERTERS = {
+        "answer_rows": _count, "stream_chunks": _count, "retry_after": _count, "paused": _flag,
+        "rate_capacity": _rate, "rate_429": _rate, "rate_5xx": _rate, "rate_run_failed": _rate,
+    }
+
+    def update(self, changes):
+        """Apply `{field: value}` changes (from /_sim/config).
+
+        Every value is checked and converted first (rates to floats from 0 to
+        1, counts to non-negative ints, `paused` to a bool, latencies to
+        samplers); if any is invalid, none are applied.
+        """
+        values = {}
+        samplers = {}
+        for key, value in changes.items():
+            if key not in self.FIELDS:
+                raise ValueError(f"Unknown setting '{key}'")
+            if key in self.DISTRIBUTIONS:
+                samplers[key] = parse_distribution(value)
+                values[key] = value
+                continue
+            try:
+                values[key] = self.CONVERTERS[key](value)
+            except (TypeError, ValueError) as e:
+                raise ValueError(f"Bad {key} {value!r}: {e}") from None
+        for key, value in values.items():
+            setattr(self, key, value)
+        for key, sampler in samplers.items():
+            setattr(self, f"sample_{key}", sampler)
+
+    def to_dict(self):
+        return {key: getattr(self, key) for key in self.FIELDS}
+
+
+# ============================================================================
+# Simulated agent state
+# ============================================================================
+
+def make_answer(question, rows):
+    """Canned answer: a markdown table of `rows` rows plus the SQL behind it."""
+    lines = [
+        f"Here are the results for: {question}",
+        "",
+        "| Rank | Description | Patient Count | Total Cost |",
+        "|---|---|---|---|",
+    ]
+    for i in range(1, rows + 1):
+        lines.append(f"| {i} | Item {i} | {1000 - i * 7} | {round(250000 / i, 2)} |")
+    lines += [
+        "",
+        "```sql",
+        "SELECT TOP %d description, COUNT(DISTINCT patient) AS patient_count, SUM(totalcost) AS total_cost" % rows,
+        "FROM medications",
+        "GROUP BY description",
+        "ORDER BY total_cost DESC",
+        "```",
+    ]
+    return "\n".join(lines)
+
+
+def _new_id(prefix):
+    return f"{prefix}_{uuid.uuid4().hex[:24]}"
+
+
+def _message(thread_id, role, text, run_id=None, assistant_id=None):
+    return {
+        "id": _new_id("msg"),
+        "object": "thread.message",
+        "created_at": int(time.time()),
+        "thread_id": thread_id,
+        "role": role,
+        "content": [{"type": "text", "text": {"value": text, "annotations": []}}],
+        "assistant_id": assistant_id,
+        "run_id": run_id,
+    }
+
+
+class SimulatedRun:
+    """A run whose status follows from the time elapsed since it was created."""
+
+    def __init__(self, thread_id, assistant_id, question, queue_time, run_time, fails):
+        self.id = _new_id("run")
+        self.thread_id = thread_id
+        self.assistant_id = assistant_id
+        self.question = question
+        self.created = time.monotonic()
+        self.created_wall = time.time()
+        self.created_at = int(self.created_wall)
+        self.queue_time = queue_time
+        self.run_time = run_time
+        self.fails = fails
+        self.finished = False
+        self.step_id = _new_id("step")
+
+    def status(self, now=None):
+        elapsed = (now or time.monotonic()) - self.created
+        if elapsed < self.queue_time:
+            return "queued"
+        if elapsed < self.queue_time + self.run_time:
+            return "in_progress"
+        return "failed" if self.fails else "completed"
+
+    def to_dict(self, status=None):
+        status = status or self.status()
+        return {
+            "id": self.id,
+            "object": "thread.run",
+            "created_at": self.created_at,
+            "thread_id": self.thread_id,
+            "assistant_id": self.assistant_id,
+            "status": status,
+            "started_at": None if status == "queued" else int(self.created_wall + self.queue_time),
+            "completed_at": int(self.created_wall + self.queue_time + self.run_time) if status == "completed" else None,
+            "failed_at": int(self.created_wall + self.queue_time + self.run_time) if status == "failed" else None,
+            "last_error": {"code": "server_error", "message": "Simulated run failure"} if status == "failed" else None,
+        }
+
+    def step_dict(self, status):
+        """The run's single message-creation step, as streamed in `thread.run.step.*` events."""
+        return {
+            "id": self.step_id,
+            "object": "thread.run.step",
+            "created_at": self.created_at,
+            "run_id": self.id,
+            "thread_id": self.thread_id,
+            "assistant_id": self.assistant_id,
+            "type": "message_creation",
+            "status": status,
+        }
+
+
+class SimulatorState:
+    """In-memory assistants, threads, messages and runs, plus request counters."""
+
+    def __init__(self, config):
+        self.config = config
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.assistants = set()
+            self.threads = {}       # thread_id -> list of messages (oldest first)
+            self.runs = {}          # run_id -> SimulatedRun
+            self.counts = {}
+
+    def count(self, key):
+        with self.lock:
+            self.counts[key] = self.counts.get(key, 0) + 1
+
+    def finish_run(self, run):
+        """Append the run's answer to its thread once (when it is first seen completed)."""
+        with self.lock:
+            if run.finished or run.status() != "completed":
+                return
+            run.finished = True
+            messages = self.threads.get(run.thread_id)
+            if messages is not None:
+                text = make_answer(run.question, self.config.answer_rows)
+                messages.append(_message(run.thread_id, "assistant", text, run.id, run.assistant_id))
+
+    def active_run(self, thread_id):
+        for run in self.runs.values():
+            if run.thread_id == thread_id and run.status() in ("queued", "in_progress"):
+                return run
+        return None
+
+    def stats(self):
+        with self.lock:
+            runs = list(self.runs.values())
+            return {
+                "requests": dict(sorted(self.counts.items())),
+                "assistants": len(self.assistants),
+                "threads": len(self.threads),
+                "runs": len(runs),
+                "active_runs": sum(1 for r in runs if r.status() in ("queued", "in_progress")),
+            }
+
+
+# ============================================================================
+# HTTP handler
+# ============================================================================
+
+ROUTES = [
+    ("POST", re.compile(r"/assistants$"), "create_assistant"),
+    ("GET", re.compile(r"/assistants$"), "list_assistants"),
+    ("POST", re.compile(r"/threads$"), "create_thread"),
+    ("DELETE", re.compile(r"/threads/(?P<thread_id>[^/]+)$"), "delete_thread"),
+    ("POST", re.compile(r"/threads/(?P<thread_id>[^/]+)/messages$"), "create_message"),
+    ("GET", re.compile(r"/threads/(?P<thread_id>[^/]+)/messages$"), "list_messages"),
+    ("POST", re.compile(r"/threads/(?P<thread_id>[^/]+)/runs$"), "create_run"),
+    ("GET", re.compile(r"/threads/(?P<thread_id>[^/]+)/runs/(?P<run_id>[^/]+)$"), "get_run"),
+]
+
+
+class SimulatorHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, like the real endpoint
+    disable_nagle_algorithm = True  # Headers and body are separate writes; don't wait on delayed ACKs
+    state = None                   # Set on the per-server subclass
+
+    def log_message(self, format, *args):
+        pass  # One line per request drowns out the load generator's output
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def do_DELETE(self):
+        self._dispatch("DELETE")
+
+    # ------------------------------------------------------------------
+
+    def _dispatch(self, method):
+        url = urlsplit(self.path)
+        self.query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        try:
+            self.body = json.loads(raw) if raw else {}
+        except ValueError:
+            return self._error(400, "invalid_request_error", "Body is not valid JSON")
+
+        if url.path.startswith("/_sim/"):
+            return self._control(method, url.path[len("/_sim/"):])
+
+        for route_method, pattern, name in ROUTES:
+            match = pattern.search(url.path)
+            if match and route_method == method:
+                break
+        else:
+            return self._error(404, "not_found", f"No route for {method} {url.path}")
+
+        state = self.state
+        config = state.config
+        state.count(name)
+        time.sleep(config.sample_http_latency(config.rng))
+        if self._inject_fault(name):
+            return
+        getattr(self, name)(**match.groupdict())
+
+    def _inject_fault(self, name):
+        state = self.state
+        config = state.config
+        roll = config.rng.random()
+        if config.paused or roll < config.rate_capacity:
+            state.count("fault_capacity")
+            self._send_json(404, {"errorCode": "CapacityNotActive", "message": "Capacity is not active (simulated)"})
+            return True
+        roll -= config.rate_capacity
+        if roll < config.rate_429:
+            state.count("fault_429")
+            self._send_json(429, {"error": {"code": "rate_limit_exceeded", "message": "Too many requests (simulated)"}},
+                            headers={"Retry-After": str(config.retry_after)})
+            return True
+        roll -= config.rate_429
+        if roll < config.rate_5xx:
+            state.count("fault_5xx")
+            status = config.rng.choice((500, 502, 503))
+            self._send_json(status, {"error": {"code": "server_error", "message": f"HTTP {status} (simulated)"}})
+            return True
+        return False
+
+    def _control(self, method, action):
+        state = self.state
+        if method == "GET" and action == "stats":
+            return self._send_json(200, {**state.stats(), "config": state.config.to_dict()})
+        if method == "POST" and action == "config":
+            try:
+                state.config.update(self.body)
+            except ValueError as e:
+                return self._error(400, "invalid_request_error", str(e))
+            return self._send_json(200, state.config.to_dict())
+        if method == "POST" and action == "reset":
+            state.reset()
+            return self._send_json(200, {"reset": True})
+        return self._error(404, "not_found", f"No control route {method} /_sim/{action}")
+
+    # ------------------------------------------------------------------
+    # Routes
+    # ------------------------------------------------------------------
+
+    def create_assistant(self):
+        assistant_id = _new_id("asst")
+        with self.state.lock:
+            self.state.assistants.add(assistant_id)
+        self._send_json(200, {"id": assistant_id, "object": "assistant", "model": self.body.get("model")})
+
+    def list_assistants(self):
+        with self.state.lock:
+            data = [{"id": a, "object": "assistant"} for a in self.state.assistants]
+        self._send_json(200, {"object": "list", "data": data})
+
+    def create_thread(self):
+        thread_id = _new_id("thread")
+        with self.state.lock:
+            self.state.threads[thread_id] = []
+        self._send_json(200, {"id": thread_id, "object": "thread", "created_at": int(time.time())})
+
+    def delete_thread(self, thread_id):
+        with self.state.lock:
+            deleted = self.state.threads.pop(thread_id, None) is not None
+            for run_id in [r.id for r in self.state.runs.values() if r.thread_id == thread_id]:
+                del self.state.runs[run_id]
+        if not deleted:
+            return self._error(404, "not_found", f"No thread found with id '{thread_id}'")
+        self._send_json(200, {"id": thread_id, "object": "thread.deleted", "deleted": True})
+
+    def create_message(self, thread_id):
+        state = self.state
+        with state.lock:
+            messages = state.threads.get(thread_id)
+            if messages is None:
+                return self._error(404, "not_found", f"No thread found with id '{thread_id}'")
+            if state.active_run(thread_id):
+                return self._error(400, "invalid_request_error", "Can't add messages while a run is active")
+            message = _message(thread_id, self.body.get("role", "user"), str(self.body.get("content", "")))
+            messages.append(message)
+        self._send_json(200, message)
+
+    def list_messages(self, thread_id):
+        state = self.state
+        with state.lock:
+            runs = [r for r in state.runs.values() if r.thread_id == thread_id]
+        for run in runs:
+            state.finish_run(run)
+        with state.lock:
+            messages = state.threads.get(thread_id)
+            if messages is None:
+                return self._error(404, "not_found", f"No thread found with id '{thread_id}'")
+            messages = list(messages)
+
+        # Cursor paging as in the Assistants API: order, limit, after, before
+        if self.query.get("order", "desc") == "desc":
+            messages.reverse()
+        ids = [m["id"] for m in messages]
+        if self.query.get("after") in ids:
+            messages = messages[ids.index(self.query["after"]) + 1:]
+        if self.query.get("before") in ids:
+            messages = messages[:[m["id"] for m in messages].index(self.query["before"])]
+        limit = min(max(int(self.query.get("limit", 20)), 1), 100)
+        page = messages[:limit]
+        self._send_json(200, {
+            "object": "list",
+            "data": page,
+            "first_id": page[0]["id"] if page else None,
+            "last_id": page[-1]["id"] if page else None,
+            "has_more": len(messages) > limit,
+        })
+
+    def create_run(self, thread_id):
+        state = self.state
+        config = state.config
+        assistant_id = self.body.get("assistant_id")
+        with state.lock:
+            messages = state.threads.get(thread_id)
+            if messages is None:
+                return self._error(404, "not_found", f"No thread found with id '{thread_id}'")
+            if assistant_id not in state.assistants:
+                return self._error(404, "not_found", f"No assistant found with id '{assistant_id}'")
+            if state.active_run(thread_id):
+                return self._error(400, "invalid_request_error", "Thread already has an active run")
+            questions = [m for m in messages if m["role"] == "user"]
+            question = questions[-1]["content"][0]["text"]["value"] if questions else ""
+            run = SimulatedRun(
+                thread_id, assistant_id, question,
+                queue_time=config.sample_queue_time(config.rng),
+                run_time=config.sample_run_time(config.rng),
+                fails=config.rng.random() < config.rate_run_failed,
+            )
+            state.runs[run.id] = run
+        if run.fails:
+            state.count("fault_run_failed")
+
+        if self.body.get("stream"):
+            return self._stream_run(run)
+        self._send_json(200, run.to_dict())
+
+    def get_run(self, thread_id, run_id):
+        run = self.state.runs.get(run_id)
+        if run is None or run.thread_id != thread_id:
+            return self._error(404, "not_found", f"No run found with id '{run_id}'")
+        self.state.finish_run(run)
+        self._send_json(200, run.to_dict())
+
+    def _stream_run(self, run):
+        """Answer a streamed run with Assistants-style server-sent events."""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")  # The body ends when the connection does
+        self.end_headers()
+        self.close_connection = True
+
+        try:
+            self._send_event("thread.run.created", run.to_dict("queued"))
+            self._send_event("thread.run.queued", run.to_dict("queued"))
+            time.sleep(run.queue_time)
+            self._send_event("thread.run.in_progress", run.to_dict("in_progress"))
+            self._send_event("thread.run.step.created", run.step_dict("in_progress"))
+            self._send_event("thread.run.step.in_progress", run.step_dict("in_progress"))
+
+            if run.fails:
+                time.sleep(run.run_time)
+                self._send_event("thread.run.step.failed", run.step_dict("failed"))
+                self._send_event("thread.run.failed", run.to_dict("failed"))
+            else:
+                config = self.state.config
+                text = make_answer(run.question, config.answer_rows)
+                chunks = max(int(config.stream_chunks), 1)
+                size = max(math.ceil(len(text) / chunks), 1)
+                message_id = _new_id("msg")
+                for start in range(0, len(text), size):
+                    time.sleep(run.run_time / chunks)
+                    self._send_event("thread.message.delta", {
+                        "id": message_id,
+                        "object": "thread.message.delta",
+                        "delta": {"content": [{"index": 0, "type": "text", "text": {"value": text[start:start + size]}}]},
+                    })
+                time.sleep(max(run.queue_time + run.run_time - (time.monotonic() - run.created), 0))
+                self.state.finish_run(run)
+                message = _message(run.thread_id, "assistant", text, run.id, run.assistant_id)
+                message["id"] = message_id
+                self._send_event("thread.message.completed", message)
+                self._send_event("thread.run.step.completed", run.step_dict("completed"))
+                self._send_event("thread.run.completed", run.to_dict("completed"))
+            self.wfile.write(b"event: done\ndata: [DONE]\n\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # Client went away mid-stream; the run carries on server-side
+
+    def _send_event(self, event, data):
+        self.wfile.write(f"event: {event}\ndata: {json.dumps(data)}\n\n".encode("utf-8"))
+        self.wfile.flush()
+
+    # ------------------------------------------------------------------
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _error(self, status, code, message):
+        self._send_json(status, {"error": {"code": code, "message": message}})
+
+
+# ============================================================================
+# Server
+# ============================================================================
+
+class FabricSimulator:
+    """Simulator server on a background thread (port 0 picks a free port)."""
+
+    def __init__(self, config=None, host="127.0.0.1", port=0, base_path=DEFAULT_BASE_PATH):
+        self.config = config or SimulatorConfig()
+        self.state = SimulatorState(self.config)
+        handler = type("BoundSimulatorHandler", (SimulatorHandler,), {"state": self.state})
+        self.server = ThreadingHTTPServer((host, port), handler)
+        self.server.daemon_threads = True
+        self.base_path = base_path
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}{self.base_path}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, name="fabric-simulator", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local Fabric Data Agent simulator")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--queue-time", default="lognormal:1,0.5", help="Seconds a run stays queued (distribution spec)")
+    parser.add_argument("--run-time", default="lognormal:6,0.4", help="Seconds a run stays in progress (distribution spec)")
+    parser.add_argument("--http-latency", default="uniform:0.02,0.08", help="Added to every API call (distribution spec)")
+    parser.add_argument("--answer-rows", type=int, default=10, help="Rows in the answer's markdown table")
+    parser.add_argument("--stream-chunks", type=int, default=20, help="Text deltas per streamed answer")
+    parser.add_argument("--paused", action="store_true", help="Start with the capacity paused")
+    parser.add_argument("--rate-capacity", type=float, default=0.0, help="Fraction of calls answered 404 CapacityNotActive")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="Fraction of calls answered 429")
+    parser.add_argument("--rate-5xx", type=float, default=0.0, help="Fraction of calls answered 500/502/503")
+    parser.add_argument("--rate-run-failed", type=float, default=0.0, help="Fraction of runs that fail with server_error")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds sent with 429s")
+    parser.add_argument("--seed", type=int, help="Random seed for reproducible latencies and faults")
+    args = parser.parse_args()
+
+    try:
+        config = SimulatorConfig(
+            queue_time=args.queue_time, run_time=args.run_time, http_latency=args.http_latency,
+            answer_rows=args.answer_rows, stream_chunks=args.stream_chunks, paused=args.paused,
+            rate_capacity=args.rate_capacity, rate_429=args.rate_429, rate_5xx=args.rate_5xx,
+            rate_run_failed=args.rate_run_failed, retry_after=args.retry_after, seed=args.seed,
+        )
+    except ValueError as e:
+        parser.error(str(e))
+
+    simulator = FabricSimulator(config, host=args.host, port=args.port)
+    print(f"Fabric Data Agent simulator listening on {simulator.base_url}")
+    print(f"  Queue time: {config.queue_time}   Run time: {config.run_time}   HTTP latency: {config.http_latency}")
+    print(f"  Faults: capacity {config.rate_capacity:.0%}, 429 {config.rate_429:.0%}, "
+          f"5xx {config.rate_5xx:.0%}, run failed {config.rate_run_failed:.0%}"
+          + (" (capacity paused)" if config.paused else ""))
+    try:
+        simulator.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        simulator.server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,13 +4,15 @@ Runs each query one at a time to avoid interruptions.
 """
 
 import os
+import sys
 import time
 import json
 from pathlib import Path
 from datetime import datetime
 from dotenv import load_dotenv
-import requests
-from msal import ConfidentialClientApplication
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+from services.fabric_client import ask_for_result, close_fabric_clients, fabric_api_base, get_fabric_client, get_fabric_token_provider
 
 # Load environment
 load_dotenv(Path(__file__).parent.parent / "src" / ".env")
@@ -20,73 +22,18 @@ FABRIC_CLIENT_SECRET = os.getenv('FABRIC_CLIENT_SECRET')
 FABRIC_TENANT_ID = os.getenv('FABRIC_TENANT_ID')
 FABRIC_WORKSPACE_ID = os.getenv('FABRIC_WORKSPACE_ID')
 FABRIC_ARTIFACT_ID = os.getenv('FABRIC_ARTIFACT_ID')
-FABRIC_API_BASE = f'https://api.fabric.microsoft.com/v1/workspaces/{FABRIC_WORKSPACE_ID}/dataagents/{FABRIC_ARTIFACT_ID}/aiassistant/openai'
-API_VERSION = '2024-07-01-preview'
-
-# Get token once
-def get_token():
-    authority = f'https://login.microsoftonline.com/{FABRIC_TENANT_ID}'
-    app = ConfidentialClientApplication(FABRIC_CLIENT_ID, authority=authority, client_credential=FABRIC_CLIENT_SECRET)
-    result = app.acquire_token_for_client(['https://api.fabric.microsoft.com/.default'])
-    return result['access_token']
+FABRIC_API_BASE = fabric_api_base(FABRIC_WORKSPACE_ID, FABRIC_ARTIFACT_ID, os.getenv('FABRIC_API_BASE'))
 
-TOKEN = get_token()
-HEADERS = {'Authorization': f'Bearer {TOKEN}', 'Content-Type': 'application/json'}
+# Same client (token cache, polling, retries, timeouts) as the app
+CLIENT = get_fabric_client(FABRIC_API_BASE, get_fabric_token_provider(FABRIC_TENANT_ID, FABRIC_CLIENT_ID, FABRIC_CLIENT_SECRET))
 
-def run_query(query, timeout_secs=120):
+def run_query(query):
     """Run a single query and return result."""
-    start = time.time()
-    
-    try:
-        # Create assistant
-        resp = requests.post(f'{FABRIC_API_BASE}/assistants?api-version={API_VERSION}', headers=HEADERS, json={'model': 'not used'}, timeout=60)
-        resp.raise_for_status()
-        assistant_id = resp.json()['id']
-        
-        # Create thread
-        resp = requests.post(f'{FABRIC_API_BASE}/threads?api-version={API_VERSION}', headers=HEADERS, json={}, timeout=30)
-        resp.raise_for_status()
-        thread_id = resp.json()['id']
-        
-        # Add message
-        resp = requests.post(f'{FABRIC_API_BASE}/threads/{thread_id}/messages?api-version={API_VERSION}', headers=HEADERS, json={'role': 'user', 'content': query}, timeout=30)
-        resp.raise_for_status()
-        
-        # Create run
-        resp = requests.post(f'{FABRIC_API_BASE}/threads/{thread_id}/runs?api-version={API_VERSION}', headers=HEADERS, json={'assistant_id': assistant_id}, timeout=30)
-        resp.raise_for_status()
-        run_id = resp.json()['id']
-        run_status = resp.json()['status']
-        
-        # Poll for completion
-        poll_start = time.time()
-        while run_status in ['queued', 'in_progress']:
-            if time.time() - poll_start > timeout_secs:
-                return {'success': False, 'error': 'Timeout', 'elapsed': time.time() - start}
-            time.sleep(2)
-            resp = requests.get(f'{FABRIC_API_BASE}/threads/{thread_id}/runs/{run_id}?api-version={API_VERSION}', headers=HEADERS, timeout=30)
-            run_status = resp.json()['status']
-        
-        if run_status == 'completed':
-            resp = requests.get(f'{FABRIC_API_BASE}/threads/{thread_id}/messages?api-version={API_VERSION}&order=asc', headers=HEADERS, timeout=30)
-            messages = resp.json()
-            for msg in messages.get('data', []):
-                if msg.get('role') == 'assistant':
-                    for content in msg.get('content', []):
-                        if content.get('type') == 'text':
-                            return {
-                                'success': True, 
-                                'response': content.get('text', {}).get('value', ''),
-                                'elapsed': time.time() - start
-                            }
-        else:
-            error = resp.json().get('last_error', {})
-            return {'success': False, 'error': f'{run_status}: {error}', 'elapsed': time.time() - start}
-            
-    except Exception as e:
-        return {'success': False, 'error': str(e), 'elapsed': time.time() - start}
-    
-    return {'success': False, 'error': 'Unknown', 'elapsed': time.time() - start}
+    result = ask_for_result(CLIENT, query)
+    result['elapsed'] = result.pop('elapsed_time')
+    if not result['success']:
+        result['error'] = f"{result['error']}: {result.get('message', '')}"
+    return result
 
 # Quick questions from the UI
 QUICK_QUESTIONS = [
@@ -144,4 +91,7 @@ def main():
     print("\nResults saved to quick_test_results.json")
 
 if __name__ == "__main__":
-    main()
+    try:
+        main()
+    finally:
+        close_fabric_clients()
@@ -7,15 +7,26 @@ import os
 import sys
 import time
 import json
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
 
-# Add parent directory to path to allow imports
+# Add parent and src directories to path to allow imports
 sys.path.insert(0, str(Path(__file__).parent.parent))
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
 
 from dotenv import load_dotenv
-import requests
-from msal import ConfidentialClientApplication
+from services.fabric_client import (
+    StaticTokenProvider,
+    ask_for_result,
+    close_fabric_clients,
+    fabric_api_base,
+    get_fabric_client,
+    get_fabric_token_provider,
+)
+from services.query_stats import percentile
 
 # Load environment variables from src directory
 env_path = Path(__file__).parent.parent / "src" / ".env"
@@ -28,13 +39,18 @@ else:
     print("⚠️ Using default .env location")
 
 # Fabric configuration
-FABRIC_API_BASE = os.getenv("FABRIC_API_BASE")
 FABRIC_WORKSPACE_ID = os.getenv("FABRIC_WORKSPACE_ID")
 FABRIC_ARTIFACT_ID = os.getenv("FABRIC_ARTIFACT_ID")
+# Endpoint named outright (FABRIC_API_BASE or --base-url); otherwise derived from the IDs, as in the app
+ENDPOINT_OVERRIDE = os.getenv("FABRIC_API_BASE")
+FABRIC_API_BASE = fabric_api_base(FABRIC_WORKSPACE_ID, FABRIC_ARTIFACT_ID, ENDPOINT_OVERRIDE)
 FABRIC_TENANT_ID = os.getenv("FABRIC_TENANT_ID")
 FABRIC_CLIENT_ID = os.getenv("FABRIC_CLIENT_ID")
 FABRIC_CLIENT_SECRET = os.getenv("FABRIC_CLIENT_SECRET")
 
+# Bearer token to send instead of acquiring one (--token, e.g. for the local simulator)
+STATIC_TOKEN = None
+
 # Test categories
 TEST_CATEGORIES = {
     "schema_discovery": [
@@ -101,181 +117,29 @@ TEST_CATEGORIES = {
 }
 
 
-def get_fabric_token():
-    """Get authentication token using MSAL."""
-    authority = f"https://login.microsoftonline.com/{FABRIC_TENANT_ID}"
-    
-    app = ConfidentialClientApplication(
-        FABRIC_CLIENT_ID,
-        authority=authority,
-        client_credential=FABRIC_CLIENT_SECRET
-    )
-    
-    scopes = ["https://api.fabric.microsoft.com/.default"]
-    result = app.acquire_token_for_client(scopes=scopes)
-    
-    if "access_token" in result:
-        return result["access_token"]
-    else:
-        raise Exception(f"Token acquisition failed: {result.get('error_description', result)}")
+def get_token_provider():
+    """Token provider for the shared client: --token if given, else the app registration (MSAL)."""
+    if STATIC_TOKEN:
+        return StaticTokenProvider(STATIC_TOKEN)
+    return get_fabric_token_provider(FABRIC_TENANT_ID, FABRIC_CLIENT_ID, FABRIC_CLIENT_SECRET)
 
 
 def call_fabric_agent(user_message, max_retries=3):
-    """Call the Fabric Data Agent API with retry logic."""
+    """Call the Fabric Data Agent through the app's shared client.
     
-    for attempt in range(max_retries):
-        try:
-            token = get_fabric_token()
-            base_url = FABRIC_API_BASE
-            api_version = "2024-07-01-preview"
-            
-            headers = {
-                "Authorization": f"Bearer {token}",
-                "Content-Type": "application/json",
-                "Accept": "application/json"
-            }
-            
-            # Step 1: Create an assistant
-            assistant_resp = requests.post(
-                f"{base_url}/assistants?api-version={api_version}",
-                headers=headers,
-                json={"model": "not used"},
-                timeout=60
-            )
-            
-            # Check for Capacity Not Active error
-            if assistant_resp.status_code == 404:
-                resp_json = assistant_resp.json() if assistant_resp.text else {}
-                if resp_json.get("errorCode") == "CapacityNotActive":
-                    return {
-                        "success": False,
-                        "error": "CapacityNotActive",
-                        "message": "Fabric capacity is paused"
-                    }
-            
-            assistant_resp.raise_for_status()
-            assistant = assistant_resp.json()
-            assistant_id = assistant.get("id")
-            
-            # Step 2: Create a thread
-            thread_resp = requests.post(
-                f"{base_url}/threads?api-version={api_version}",
-                headers=headers,
-                json={},
-                timeout=30
-            )
-            thread_resp.raise_for_status()
-            thread = thread_resp.json()
-            thread_id = thread.get("id")
-            
-            # Step 3: Add message to thread
-            msg_resp = requests.post(
-                f"{base_url}/threads/{thread_id}/messages?api-version={api_version}",
-                headers=headers,
-                json={"role": "user", "content": user_message},
-                timeout=30
-            )
-            msg_resp.raise_for_status()
-            
-            # Step 4: Create a run
-            run_resp = requests.post(
-                f"{base_url}/threads/{thread_id}/runs?api-version={api_version}",
-                headers=headers,
-                json={"assistant_id": assistant_id},
-                timeout=30
-            )
-            run_resp.raise_for_status()
-            run = run_resp.json()
-            run_id = run.get("id")
-            run_status = run.get("status")
-            
-            # Step 5: Poll for completion
-            max_wait = 120  # 2 minutes max
-            poll_interval = 2
-            start_time = time.time()
-            
-            while run_status in ['queued', 'in_progress']:
-                if time.time() - start_time > max_wait:
-                    return {
-                        "success": False,
-                        "error": "Timeout",
-                        "message": "Request timed out"
-                    }
-                time.sleep(poll_interval)
-                
-                status_resp = requests.get(
-                    f"{base_url}/threads/{thread_id}/runs/{run_id}?api-version={api_version}",
-                    headers=headers,
-                    timeout=30
-                )
-                status_resp.raise_for_status()
-                run = status_resp.json()
-                run_status = run.get("status")
-            
-            if run_status == 'completed':
-                # Get messages
-                msgs_resp = requests.get(
-                    f"{base_url}/threads/{thread_id}/messages?api-version={api_version}&order=asc",
-                    headers=headers,
-                    timeout=30
-                )
-                msgs_resp.raise_for_status()
-                messages = msgs_resp.json()
-                
-                # Find assistant's response
-                assistant_response = ""
-                for msg in messages.get("data", []):
-                    if msg.get("role") == "assistant":
-                        for content in msg.get("content", []):
-                            if content.get("type") == "text":
-                                assistant_response = content.get("text", {}).get("value", "")
-                
-                # Cleanup
-                try:
-                    requests.delete(
-                        f"{base_url}/threads/{thread_id}?api-version={api_version}",
-                        headers=headers,
-                        timeout=10
-                    )
-                except:
-                    pass
-                
-                elapsed = time.time() - start_time
-                return {
-                    "success": True,
-                    "response": assistant_response,
-                    "elapsed_time": elapsed,
-                    "thread_id": thread_id
-                }
-            else:
-                last_error = run.get("last_error", {})
-                return {
-                    "success": False,
-                    "error": last_error.get("code", "unknown"),
-                    "message": last_error.get("message", str(last_error)),
-                    "run_status": run_status
-                }
-                
-        except requests.exceptions.HTTPError as e:
-            if e.response and e.response.status_code >= 500 and attempt < max_retries - 1:
-                time.sleep((2 ** attempt) * 2)
-                continue
-            return {
-                "success": False,
-                "error": f"HTTP {e.response.status_code if e.response else 'unknown'}",
-                "message": e.response.text[:200] if e.response else str(e)
-            }
-        except Exception as e:
-            if attempt < max_retries - 1:
-                time.sleep((2 ** attempt) * 2)
-                continue
-            return {
-                "success": False,
-                "error": "Exception",
-                "message": str(e)
-            }
-    
-    return {"success": False, "error": "MaxRetries", "message": "Failed after max retries"}
+    Same ask flow as the app (token caching, polling, retries, timeouts,
+    admission and circuit breaker), so results reflect what users get.
+    """
+    client = get_fabric_client(FABRIC_API_BASE, get_token_provider())
+    return ask_for_result(client, user_message, max_retries)
+
+
+def missing_configuration():
+    """True if the agent's IDs (unless the endpoint is named) or, without --token, the client credentials aren't set."""
+    required = [] if ENDPOINT_OVERRIDE else [FABRIC_WORKSPACE_ID, FABRIC_ARTIFACT_ID]
+    if not STATIC_TOKEN:
+        required += [FABRIC_TENANT_ID, FABRIC_CLIENT_ID, FABRIC_CLIENT_SECRET]
+    return not all(required)
 
 
 def run_stress_test(categories=None, delay_between_queries=2):
@@ -294,7 +158,7 @@ def run_stress_test(categories=None, delay_between_queries=2):
     print(f"  Tenant ID: {FABRIC_TENANT_ID}")
     print(f"  Client ID: {FABRIC_CLIENT_ID[:8]}..." if FABRIC_CLIENT_ID else "  Client ID: NOT SET")
     
-    if not all([FABRIC_API_BASE, FABRIC_WORKSPACE_ID, FABRIC_ARTIFACT_ID, FABRIC_TENANT_ID, FABRIC_CLIENT_ID, FABRIC_CLIENT_SECRET]):
+    if missing_configuration():
         print("\n❌ ERROR: Missing required environment variables!")
         return
     
@@ -393,6 +257,230 @@ def run_stress_test(categories=None, delay_between_queries=2):
     return results
 
 
+# ============================================================================
+# Load testing: concurrent virtual users and open-loop arrival-rate ramps
+# ============================================================================
+
+class LoadRecorder:
+    """Thread-safe log of load-test requests and of how many are in flight."""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.records = []
+        self.in_flight = 0
+        self._lock = threading.Lock()
+
+    def call(self, query, step, scheduled=None):
+        """Ask `query` and record the outcome under `step`.
+
+        Latency is measured from `scheduled` (the open-loop arrival time) when
+        given, so time spent waiting for a free worker counts as latency
+        instead of silently lowering the offered load.
+        """
+        with self._lock:
+            self.in_flight += 1
+            concurrency = self.in_flight
+        start = time.monotonic()
+        try:
+            result = call_fabric_agent(query)
+        except Exception as e:
+            result = {"success": False, "error": "Exception", "message": str(e)}
+        end = time.monotonic()
+        arrival = scheduled if scheduled is not None else start
+        with self._lock:
+            self.in_flight -= 1
+            self.records.append({
+                "step": step,
+                "query": query,
+                "start": arrival - self.started,
+                "end": end - self.started,
+                "latency": end - arrival,
+                "concurrency": concurrency,
+                "success": result["success"],
+                "error": result.get("error"),
+            })
+        return result
+
+
+def summarize_requests(records):
+    """Request count, throughput, p50/p90/p99 latency and error rate for `records`."""
+    latencies = [r["latency"] for r in records if r["success"]]
+    errors = sum(1 for r in records if not r["success"])
+    span = (max(r["end"] for r in records) - min(r["start"] for r in records)) if records else 0
+    return {
+        "requests": len(records),
+        "throughput": len(records) / span if span > 0 else 0,
+        "p50": percentile(latencies, 50),
+        "p90": percentile(latencies, 90),
+        "p99": percentile(latencies, 99),
+        "errors": errors,
+        "error_rate": errors / len(records) if records else 0,
+        "mean_concurrency": sum(r["concurrency"] for r in records) / len(records) if records else 0,
+    }
+
+
+def _seconds(value):
+    return f"{value:.2f}s" if value is not None else "-"
+
+
+def run_concurrent_test(queries, user_levels, step_duration, recorder):
+    """Closed loop: for each level, that many virtual users ask back to back for `step_duration` seconds."""
+    steps = []
+    for users in user_levels:
+        step = f"{users} users"
+        print(f"\n👥 {step} for {step_duration}s")
+        deadline = time.monotonic() + step_duration
+
+        def virtual_user():
+            while time.monotonic() < deadline:
+                recorder.call(random.choice(queries), step)
+
+        with ThreadPoolExecutor(max_workers=users) as pool:
+            for _ in range(users):
+                pool.submit(virtual_user)
+        steps.append({"step": step, "level": users})
+        _print_step(step, [r for r in recorder.records if r["step"] == step])
+    return steps
+
+
+def run_open_loop_test(queries, rates, step_duration, recorder, max_in_flight=100):
+    """Open loop: requests arrive as a Poisson process at each rate (per second) regardless of how fast they finish."""
+    steps = []
+    with ThreadPoolExecutor(max_workers=max_in_flight) as pool:
+        for rate in rates:
+            step = f"{rate:g} req/s"
+            print(f"\n📈 {step} for {step_duration}s")
+            step_start = time.monotonic()
+            next_arrival = step_start
+            while True:
+                next_arrival += random.expovariate(rate)
+                if next_arrival >= step_start + step_duration:
+                    break
+                time.sleep(max(next_arrival - time.monotonic(), 0))
+                pool.submit(recorder.call, random.choice(queries), step, next_arrival)
+            time.sleep(max(step_start + step_duration - time.monotonic(), 0))
+            steps.append({"step": step, "level": rate})
+            # Stragglers of this step are still running; report what has finished
+            _print_step(step, [r for r in recorder.records if r["step"] == step])
+    return steps
+
+
+def _print_step(step, records):
+    summary = summarize_requests(records)
+    print(f"  {summary['requests']} done, {summary['throughput']:.2f} req/s, "
+          f"p50 {_seconds(summary['p50'])}, p99 {_seconds(summary['p99'])}, "
+          f"errors {summary['error_rate']:.0%}, avg in flight {summary['mean_concurrency']:.1f}")
+
+
+def find_degradation(step_summaries, factor=1.5, max_error_rate=0.05):
+    """First step whose p50 exceeds `factor` x the first step's, or whose error rate exceeds `max_error_rate`."""
+    baseline = next((s["p50"] for s in step_summaries if s["p50"] is not None), None)
+    for summary in step_summaries:
+        if summary["error_rate"] > max_error_rate:
+            return summary, f"error rate {summary['error_rate']:.0%}"
+        if baseline and summary["p50"] is not None and summary["p50"] > baseline * factor:
+            return summary, f"p50 {summary['p50']:.2f}s vs {baseline:.2f}s at the first step"
+    return None, None
+
+
+def print_load_report(recorder, steps, window=10, degrade_factor=1.5):
+    """Print per-step and over-time results; returns the report as a dict."""
+    records = recorder.records
+    step_summaries = []
+    for step in steps:
+        summary = summarize_requests([r for r in records if r["step"] == step["step"]])
+        step_summaries.append({**step, **summary})
+
+    print("\n" + "=" * 80)
+    print("LOAD TEST SUMMARY")
+    print("=" * 80)
+    print(f"{'Step':<14}{'Requests':>9}{'Req/s':>8}{'p50':>9}{'p90':>9}{'p99':>9}{'Errors':>8}{'In flight':>11}")
+    for s in step_summaries:
+        print(f"{s['step']:<14}{s['requests']:>9}{s['throughput']:>8.2f}{_seconds(s['p50']):>9}{_seconds(s['p90']):>9}"
+              f"{_seconds(s['p99']):>9}{s['error_rate']:>8.0%}{s['mean_concurrency']:>11.1f}")
+
+    # Over time, bucketed by completion time
+    timeline = []
+    if records:
+        end = max(r["end"] for r in records)
+        print(f"\nOver time ({window}s windows):")
+        print(f"{'Window':<14}{'Done':>6}{'Req/s':>8}{'p50':>9}{'Errors':>8}")
+        bucket_start = 0
+        while bucket_start < end:
+            bucket = [r for r in records if bucket_start <= r["end"] < bucket_start + window]
+            summary = summarize_requests(bucket)
+            timeline.append({"start": bucket_start, **summary, "throughput": len(bucket) / window})
+            label = f"{bucket_start:.0f}-{bucket_start + window:.0f}s"
+            print(f"{label:<14}{len(bucket):>6}{len(bucket) / window:>8.2f}{_seconds(summary['p50']):>9}{summary['error_rate']:>8.0%}")
+            bucket_start += window
+
+    degraded, reason = find_degradation(step_summaries, degrade_factor)
+    print()
+    if degraded:
+        print(f"⚠️ Latency degrades at {degraded['step']} (~{degraded['mean_concurrency']:.0f} in flight): {reason}")
+    else:
+        print(f"✅ No degradation beyond {degrade_factor}x the first step's p50 across the tested levels")
+
+    errors = {}
+    for r in records:
+        if not r["success"]:
+            errors[r["error"]] = errors.get(r["error"], 0) + 1
+    if errors:
+        print("Errors: " + ", ".join(f"{k} x{v}" for k, v in sorted(errors.items(), key=lambda kv: -kv[1])))
+
+    return {
+        "steps": step_summaries,
+        "timeline": timeline,
+        "degraded_at": degraded["step"] if degraded else None,
+        "degradation_reason": reason,
+        "errors": errors,
+        "requests": records,
+    }
+
+
+def run_load_test(categories=None, user_levels=None, rates=None, step_duration=60, window=10,
+                  degrade_factor=1.5, max_in_flight=100):
+    """Run a concurrent (`user_levels`) or open-loop (`rates`) load test and save the results."""
+    print("=" * 80)
+    print("HEALTHCARE AGENT LOAD TEST")
+    print(f"Started: {datetime.now().isoformat()}")
+    print(f"API Base: {FABRIC_API_BASE}")
+    print("=" * 80)
+
+    if missing_configuration():
+        print("\n❌ ERROR: Missing required environment variables!")
+        return
+
+    categories = categories or list(TEST_CATEGORIES.keys())
+    queries = [q for c in categories for q in TEST_CATEGORIES.get(c, [])]
+    if not queries:
+        print(f"⚠️ No queries in categories: {', '.join(categories)}")
+        return
+
+    recorder = LoadRecorder()
+    if rates:
+        steps = run_open_loop_test(queries, rates, step_duration, recorder, max_in_flight)
+    else:
+        steps = run_concurrent_test(queries, user_levels, step_duration, recorder)
+    report = print_load_report(recorder, steps, window, degrade_factor)
+    report["mode"] = "open-loop" if rates else "concurrent"
+
+    results_file = f"load_test_results_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    with open(results_file, "w") as f:
+        json.dump(report, f, indent=2, default=str)
+    print(f"\n📄 Detailed results saved to: {results_file}")
+    return report
+
+
+def _ramp(start, end, step):
+    rates = []
+    rate = start
+    while rate <= end + 1e-9:
+        rates.append(round(rate, 6))
+        rate += step
+    return rates
+
+
 def quick_connectivity_test():
     """Run a quick test to verify connectivity."""
     print("\n🔌 Quick Connectivity Test")
@@ -422,17 +510,46 @@ if __name__ == "__main__":
     parser.add_argument("--category", type=str, help="Test specific category only")
     parser.add_argument("--all", action="store_true", help="Run all tests")
     parser.add_argument("--delay", type=int, default=2, help="Delay between queries (seconds)")
+    parser.add_argument("--base-url", type=str, help="Agent endpoint to test instead of FABRIC_API_BASE (e.g. the local simulator)")
+    parser.add_argument("--token", type=str, help="Bearer token to send instead of acquiring one with MSAL")
+    load = parser.add_argument_group("load test (concurrent or open-loop)")
+    load.add_argument("--users", type=str, help="Concurrent virtual users per step, e.g. 1,5,10,20,30")
+    load.add_argument("--rate-start", type=float, help="Open-loop arrival rate of the first step (requests/second)")
+    load.add_argument("--rate-end", type=float, help="Arrival rate of the last step (default: --rate-start)")
+    load.add_argument("--rate-step", type=float, default=0.5, help="Arrival rate increase per step")
+    load.add_argument("--step-duration", type=int, default=60, help="Seconds per load level")
+    load.add_argument("--window", type=int, default=10, help="Seconds per bucket in the over-time report")
+    load.add_argument("--degrade-factor", type=float, default=1.5, help="p50 growth over the first step that counts as degraded")
+    load.add_argument("--max-in-flight", type=int, default=100, help="Open-loop cap on concurrent requests")
     
     args = parser.parse_args()
+    if args.base_url:
+        ENDPOINT_OVERRIDE = args.base_url
+        FABRIC_API_BASE = fabric_api_base(FABRIC_WORKSPACE_ID, FABRIC_ARTIFACT_ID, ENDPOINT_OVERRIDE)
+    if args.token:
+        STATIC_TOKEN = args.token
     
-    if args.quick:
-        quick_connectivity_test()
-    elif args.category:
-        run_stress_test(categories=[args.category], delay_between_queries=args.delay)
-    elif args.all:
-        run_stress_test(delay_between_queries=args.delay)
-    else:
-        # Default: run quick test first, then quick_questions category
-        if quick_connectivity_test():
-            print("\n" + "=" * 80)
-            run_stress_test(categories=["quick_questions"], delay_between_queries=args.delay)
+    try:
+        if args.users or args.rate_start:
+            run_load_test(
+                categories=[args.category] if args.category else None,
+                user_levels=[int(u) for u in args.users.split(",")] if args.users else None,
+                rates=_ramp(args.rate_start, args.rate_end or args.rate_start, args.rate_step) if args.rate_start else None,
+                step_duration=args.step_duration,
+                window=args.window,
+                degrade_factor=args.degrade_factor,
+                max_in_flight=args.max_in_flight,
+            )
+        elif args.quick:
+            quick_connectivity_test()
+        elif args.category:
+            run_stress_test(categories=[args.category], delay_between_queries=args.delay)
+        elif args.all:
+            run_stress_test(delay_between_queries=args.delay)
+        else:
+            # Default: run quick test first, then quick_questions category
+            if quick_connectivity_test():
+                print("\n" + "=" * 80)
+                run_stress_test(categories=["quick_questions"], delay_between_queries=args.delay)
+    finally:
+        close_fabric_clients()